@@ -0,0 +1,7 @@
+import os
+import sys
+
+# word2pdf中的模块以顶层模块的方式互相导入
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'word2pdf')
+if PACKAGE_DIR not in sys.path:
+    sys.path.insert(0, PACKAGE_DIR)
@@ -0,0 +1,51 @@
+"""conversion_engine中的超时处理"""
+import signal
+import threading
+import time
+
+import docx
+
+import conversion_engine
+
+
+def test_thread_timeout_cancels_conversion_and_removes_temp_file(tmp_path, monkeypatch):
+    # 模拟不支持SIGALRM的平台（Windows），走线程方式的超时
+    monkeypatch.delattr(signal, 'SIGALRM')
+    document = docx.Document()
+    for i in range(3000):
+        document.add_paragraph(f'第{i}段正文')
+    docx_path = tmp_path / 'long.docx'
+    document.save(docx_path)
+    pdf_path = tmp_path / 'long.pdf'
+    threads = set(threading.enumerate())
+
+    result = conversion_engine.convert_in_worker(str(docx_path), str(pdf_path), ('reportlab',),
+                                                 0.05, None, None)
+    assert result.timed_out
+    # 转换线程已在取消检查点退出并清理了临时文件，之后不会再写入PDF
+    assert set(threading.enumerate()) <= threads
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['long.docx']
+
+
+def _hanging_backend(file_path, pdf_path, log):
+    """与docx2pdf等转换方法一样捕获所有异常后返回失败"""
+    try:
+        time.sleep(5)
+    except Exception as e:
+        log(f"转换失败: {e}")
+    return False
+
+
+def test_timeout_swallowed_by_backend_still_times_out(tmp_path, monkeypatch):
+    monkeypatch.setitem(conversion_engine.BACKEND_FUNCTIONS, 'hang', _hanging_backend)
+    docx_path = tmp_path / 'doc.docx'
+    docx.Document().save(docx_path)
+    pdf_path = tmp_path / 'doc.pdf'
+
+    start = time.perf_counter()
+    result = conversion_engine.convert_in_worker(str(docx_path), str(pdf_path), ('hang', 'reportlab'),
+                                                 0.3, None, None)
+    assert time.perf_counter() - start < 3
+    # 下一个转换方法不能在没有时限的情况下继续，结果也不能算作成功
+    assert result.timed_out
+    assert not pdf_path.exists()
@@ -0,0 +1,30 @@
+"""conversion_service的排队位置在请求失败时的释放"""
+import http.client
+import threading
+
+import conversion_service
+
+
+def test_mkdtemp_failure_releases_queue_slot(tmp_path, monkeypatch):
+    # 只有一个排队位置，泄漏后之后的请求都会返回503
+    service = conversion_service.ConversionService(workers=1, max_queue=0, work_dir=str(tmp_path))
+    server = conversion_service.create_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def fail(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(conversion_service.tempfile, 'mkdtemp', fail)
+    try:
+        for _ in range(3):
+            connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=10)
+            connection.request('POST', '/convert', body=b'PK\x03\x04')
+            assert connection.getresponse().status == 500
+            connection.close()
+        assert service.stats.to_dict()['in_flight'] == 0
+        service.acquire()
+        service.release()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,35 @@
+"""document_model中目录与标题的处理"""
+import docx
+from docx.enum.style import WD_STYLE_TYPE
+
+from document_model import build_document_model
+
+
+def _toc_heading_document():
+    """“目录”标题后紧跟Word目录项段落（toc 1样式）"""
+    document = docx.Document()
+    document.add_heading('目录', 1)
+    document.styles.add_style('toc 1', WD_STYLE_TYPE.PARAGRAPH)
+    document.add_paragraph('第一章 ........ 1', style='toc 1')
+    document.add_heading('第一章', 1)
+    document.add_paragraph('正文')
+    document.add_heading('第二章', 1)
+    document.add_paragraph('正文')
+    return document
+
+
+def test_toc_heading_replaced_by_word_toc_is_not_a_heading():
+    model = build_document_model(_toc_heading_document())
+    assert model.has_toc
+    assert model.headings == [(1, '第一章'), (1, '第二章')]
+    assert [block.kind for block in model.blocks][0] == 'toc'
+
+
+def test_toc_heading_document_converts(tmp_path):
+    from conversion_engine import convert_file
+
+    docx_path = tmp_path / 'toc.docx'
+    _toc_heading_document().save(docx_path)
+    result = convert_file(str(docx_path), str(tmp_path / 'toc.pdf'), backends=('reportlab',))
+    assert result.success
+    assert result.pages >= 1
@@ -0,0 +1,50 @@
+"""font_registry中fontconfig结果的筛选和字体指纹"""
+import os
+import shutil
+import subprocess
+
+import font_registry
+
+FC_LIST_OUTPUT = (
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc\tCFF\t2\n"
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc\tTrueType\t1\n"
+    "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf\tTrueType\t0\n"
+    "/usr/share/fonts/opentype/source-han/SourceHanSans.otf\tCFF\t0\n"
+)
+
+
+def test_fontconfig_candidates_keep_only_truetype_outlines(monkeypatch):
+    monkeypatch.setattr(font_registry.sys, 'platform', 'linux')
+    monkeypatch.setattr(shutil, 'which', lambda name: '/usr/bin/fc-list')
+    monkeypatch.setattr(subprocess, 'run',
+                        lambda *args, **kwargs: subprocess.CompletedProcess(args, 0, FC_LIST_OUTPUT, ''))
+    assert font_registry._fontconfig_candidates() == [
+        ('DroidSansFallbackFull', '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf', 0),
+        ('wqyzenhei1', '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc', 1),
+    ]
+
+
+def test_no_cjk_font_falls_back_with_warning(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(font_registry, '_fontconfig_candidates', lambda: [])
+    missing = [('Missing', str(tmp_path / 'missing.ttf'), 0)]
+    registry = font_registry.FontRegistry(body_candidates=missing, heading_candidates=missing).load()
+    assert registry.fallback
+    assert registry.body_font == font_registry.FALLBACK_BODY_FONT
+    assert registry.warnings
+    assert '未找到可用的中文字体' in capsys.readouterr().err
+
+
+def test_fingerprint_stable_for_fontconfig_only_font(tmp_path, monkeypatch):
+    # 常见路径都不存在，只有fontconfig能找到字体（用reportlab自带的TrueType字体代替）
+    import reportlab
+
+    vera = os.path.join(os.path.dirname(reportlab.__file__), 'fonts', 'Vera.ttf')
+    monkeypatch.setattr(font_registry, '_fontconfig_candidates', lambda: [('Vera', vera, 0)])
+    missing = [('Missing', str(tmp_path / 'missing.ttf'), 0)]
+    monkeypatch.setattr(font_registry, '_registry',
+                        font_registry.FontRegistry(body_candidates=missing, heading_candidates=missing))
+
+    before = font_registry.fingerprint()
+    font_registry.get_registry()
+    assert font_registry.fingerprint() == before
+    assert before[0][0] == vera
@@ -0,0 +1,35 @@
+"""libreoffice_backend在转换超时时的处理"""
+import os
+import signal
+import time
+
+import docx
+import pytest
+
+import conversion_engine
+import libreoffice_backend
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGALRM'), reason="需要SIGALRM和sh")
+def test_timeout_reaches_caller_and_kills_soffice(tmp_path, monkeypatch):
+    # 一直不退出的soffice，记录自己的进程号
+    pid_path = tmp_path / 'soffice.pid'
+    soffice = tmp_path / 'soffice'
+    soffice.write_text(f'#!/bin/sh\necho $$ > {pid_path}\nexec sleep 20\n')
+    soffice.chmod(0o755)
+    monkeypatch.setenv('WORD2PDF_SOFFICE', str(soffice))
+    monkeypatch.setattr(libreoffice_backend, '_pool', None)
+    monkeypatch.setattr(libreoffice_backend, '_uno_available', lambda: False)
+    docx_path = tmp_path / 'doc.docx'
+    docx.Document().save(docx_path)
+
+    start = time.perf_counter()
+    result = conversion_engine.convert_in_worker(str(docx_path), str(tmp_path / 'doc.pdf'),
+                                                 ('libreoffice', 'reportlab'), 1.0, None, None)
+    assert time.perf_counter() - start < 10
+    # 超时不能被LibreOffice后端吞掉后改用reportlab
+    assert result.timed_out
+    assert not result.success
+    assert libreoffice_backend._pool.stats['timeouts'] == 1
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_path.read_text()), 0)
@@ -0,0 +1,45 @@
+"""分段并行排版的分页与串行排版一致"""
+import re
+
+import docx
+import pytest
+from docx.enum.style import WD_STYLE_TYPE
+
+from conversion_engine import convert_file
+from conversion_options import ConversionOptions
+
+# 目录页码Form的内容流（不压缩时）
+_TOC_NUMBER = re.compile(rb'Tm \((\d+)\) Tj T\* ET\s*endstream')
+
+
+def _chapters_document(toc_page_break):
+    """开头是Word目录，之后各章之间有分页符，内容足够分段排版"""
+    document = docx.Document()
+    document.styles.add_style('toc 1', WD_STYLE_TYPE.PARAGRAPH)
+    document.add_paragraph('Chapter 0 ........ 1', style='toc 1')
+    if toc_page_break:
+        document.add_page_break()
+    for chapter in range(6):
+        if chapter:
+            document.add_page_break()
+        document.add_heading(f'Chapter {chapter}', 1)
+        for i in range(120):
+            document.add_paragraph(f'chapter {chapter} paragraph {i} ' + 'text ' * 40)
+    return document
+
+
+@pytest.mark.parametrize('toc_page_break', [False, True])
+def test_parallel_toc_numbers_match_serial(tmp_path, toc_page_break):
+    docx_path = tmp_path / 'chapters.docx'
+    _chapters_document(toc_page_break).save(docx_path)
+
+    numbers = {}
+    for workers in (0, 2):
+        pdf_path = tmp_path / f'chapters-{workers}.pdf'
+        options = ConversionOptions(render_workers=workers, output_profile='uncompressed')
+        result = convert_file(str(docx_path), str(pdf_path), backends=('reportlab',), options=options)
+        assert result.success
+        numbers[workers] = (result.pages, _TOC_NUMBER.findall(pdf_path.read_bytes()))
+    assert result.trace['counters']['chunks'] >= 2
+    assert len(numbers[0][1]) == 6
+    assert numbers[2] == numbers[0]
@@ -0,0 +1,83 @@
+"""reportlab_renderer中长表格的分段和标题行重复、流式排版的内存上限和压缩级别"""
+import io
+import re
+
+import docx
+import pytest
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfdoc
+from reportlab.platypus import SimpleDocTemplate
+
+from conversion_errors import MemoryLimitExceeded
+from conversion_options import ConversionOptions
+from document_model import TableBlock
+from pdf_merge import PdfFile
+from reportlab_renderer import (build_styles, convert_with_reportlab, memory_usage_mb, _table_flowables,
+                                _zcompress)
+
+_CONTENTS = re.compile(rb'/Contents\s+(\d+)\s+0\s+R')
+_TEXT = re.compile(rb'\((\w+)\) Tj')
+
+
+def _page_texts(block):
+    """排版表格（不压缩），返回各页中按绘制顺序的单元格文本"""
+    buffer = io.BytesIO()
+    pdf = SimpleDocTemplate(buffer, pagesize=A4, pageCompression=0)
+    styles = build_styles('Helvetica', 'Helvetica-Bold')
+    pdf.build(_table_flowables(block, styles, 'Helvetica', pdf.width))
+    document = PdfFile(buffer.getvalue())
+    pages = []
+    for number in document.pages():
+        contents = int(_CONTENTS.search(document.objects[number][0]).group(1))
+        pages.append([text.decode() for text in _TEXT.findall(document.objects[contents][1])])
+    return pages
+
+
+def _rows(count):
+    return [[f'r{index}', f'v{index}'] for index in range(count)]
+
+
+def test_unmarked_first_row_is_not_repeated():
+    pages = _page_texts(TableBlock(_rows(100), header_rows=0))
+    texts = [text for page in pages for text in page]
+    assert texts == [text for row in _rows(100) for text in row]
+
+
+def test_marked_header_repeats_only_at_page_tops():
+    rows = [['head', 'er']] + _rows(200)
+    pages = _page_texts(TableBlock(rows, header_rows=1))
+    assert len(pages) > 1
+    for page in pages:
+        assert page[:2] == ['head', 'er']
+        assert page.count('head') == 1
+    body = [text for page in pages for text in page[2:]]
+    assert body == [text for row in _rows(200) for text in row]
+
+
+@pytest.mark.skipif(memory_usage_mb() is None, reason="无法获取进程内存")
+def test_memory_ceiling_aborts_streaming_conversion(tmp_path):
+    document = docx.Document()
+    for i in range(1000):
+        document.add_paragraph(f'第{i}段正文')
+    docx_path = tmp_path / 'long.docx'
+    document.save(docx_path)
+    pdf_path = tmp_path / 'long.pdf'
+
+    # 上限低于当前进程已占用的内存，第一次检查时即超出
+    options = ConversionOptions(max_memory_mb=1)
+    with pytest.raises(MemoryLimitExceeded):
+        convert_with_reportlab(str(docx_path), str(pdf_path), options=options)
+    assert not pdf_path.exists()
+
+
+def test_compression_override_only_during_build():
+    original = pdfdoc.PDFZCompress
+    # 导入渲染模块不改变reportlab的压缩过滤器
+    assert type(original) is pdfdoc.PDFStreamFilterZCompress
+    with _zcompress.compression(1):
+        assert pdfdoc.PDFZCompress is _zcompress
+        with _zcompress.compression(9):
+            assert pdfdoc.PDFZCompress is _zcompress
+        assert pdfdoc.PDFZCompress is _zcompress
+    assert pdfdoc.PDFZCompress is original
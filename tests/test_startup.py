@@ -0,0 +1,24 @@
+"""命令行入口启动时不导入reportlab、python-docx等重量级依赖"""
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'word2pdf')
+
+HEAVY_MODULES = ('reportlab', 'docx', 'lxml', 'PIL', 'docx2pdf', 'tkinter')
+
+
+def _loaded_modules(module):
+    code = f"import sys, json, {module}; print(json.dumps(sorted(sys.modules)))"
+    output = subprocess.run([sys.executable, '-c', code], cwd=PACKAGE_DIR, check=True,
+                            capture_output=True, text=True).stdout
+    return {name.split('.')[0] for name in json.loads(output)}
+
+
+@pytest.mark.parametrize('module', ['conversion_engine', 'watch_folder', 'conversion_service', 'benchmark'])
+def test_cli_import_is_lazy(module):
+    loaded = _loaded_modules(module)
+    assert not loaded & set(HEAVY_MODULES)
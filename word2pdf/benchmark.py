@@ -0,0 +1,497 @@
+"""
+reportlab转换路径的基准测试
+
+用python-docx生成各类测试文档（段落、中文、表格、标题/目录、图片、混合，1到1000页），
+在独立的子进程中无界面转换，记录耗时、每秒页数、峰值内存和输出大小，
+结果可保存为JSON基线；与基线比较时超过阈值的场景视为性能回退，返回非零退出码。
+同时在新的Python进程中测量命令行启动耗时，并用-X importtime检查启动时没有导入
+reportlab、python-docx等应在转换时才导入的模块；超过STARTUP_BUDGET_MS或导入了这些模块同样视为回退。
+
+    python benchmark.py --baseline bench_baseline.json --save-baseline   # 生成基线
+    python benchmark.py --baseline bench_baseline.json                   # 与基线比较
+    python benchmark.py --startup-only                                   # 只检查启动耗时
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import fnmatch
+import importlib
+import argparse
+import platform
+import statistics
+import tempfile
+import compileall
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from conversion_options import OUTPUT_PROFILES, DEFAULT_OUTPUT_PROFILE
+
+# 生成规则改变时递增，旧的测试文档不再复用
+CORPUS_VERSION = 1
+
+SCENARIOS = ('paragraphs', 'cjk', 'tables', 'headings', 'images', 'mixed')
+DEFAULT_SIZES = (1, 10, 100, 1000)
+
+# 耗时或内存超过基线的比例
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_MEMORY_THRESHOLD = 0.25
+# 耗时增加少于该秒数时不算回退，避免小文档的计时抖动
+DEFAULT_MIN_DELTA = 0.05
+
+# 启动耗时: 在本目录下用新的Python进程执行，取最快的一次（毫秒）
+STARTUP_COMMANDS = {
+    'import': ['-c', 'import conversion_engine'],
+    'cli_help': ['conversion_engine.py', '--help'],
+    'list_backends': ['conversion_engine.py', '--list-backends'],
+}
+# 启动耗时上限（毫秒），不论基线如何，超出即视为回退
+STARTUP_BUDGET_MS = 100
+# 启动耗时增加少于该毫秒数时不算回退
+STARTUP_MIN_DELTA_MS = 10
+# 导入转换引擎时不应加载的模块（实际转换时才导入）
+LAZY_MODULES = ('reportlab', 'docx', 'lxml', 'PIL', 'docx2pdf', 'tkinter')
+
+_LATIN_WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud "
+    "exercitation ullamco laboris nisi aliquip ex ea commodo consequat duis aute irure "
+    "in reprehenderit voluptate velit esse cillum fugiat nulla pariatur"
+).split()
+_CJK_CHARS = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动"
+    "同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自"
+    "二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日"
+    "那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变"
+)
+
+
+def default_corpus_dir():
+    return os.path.join(tempfile.gettempdir(), 'word2pdf-bench')
+
+
+def _latin(rng, words):
+    text = ' '.join(rng.choice(_LATIN_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def _cjk(rng, chars):
+    text = ''.join(rng.choice(_CJK_CHARS) for _ in range(chars))
+    # 每30字左右一个标点
+    return '，'.join(text[i:i + 30] for i in range(0, len(text), 30)) + '。'
+
+
+def _add_table(document, rng, rows, cols, cjk=False):
+    table = document.add_table(rows=rows, cols=cols)
+    table.style = 'Table Grid'
+    for c, cell in enumerate(table.rows[0].cells):
+        cell.text = f"列{c + 1}" if cjk else f"Column {c + 1}"
+    for row in table.rows[1:]:
+        for cell in row.cells:
+            cell.text = _cjk(rng, rng.randint(2, 12)) if cjk else _latin(rng, rng.randint(1, 6))
+    return table
+
+
+def _build_paragraphs(document, rng, pages):
+    for _ in range(pages * 8):
+        document.add_paragraph(_latin(rng, 60))
+
+
+def _build_cjk(document, rng, pages):
+    for _ in range(pages * 8):
+        p = document.add_paragraph()
+        p.add_run(_cjk(rng, 120))
+        p.add_run(_cjk(rng, 20)).bold = True
+        p.add_run(_cjk(rng, 80))
+
+
+def _build_tables(document, rng, pages):
+    for page in range(pages):
+        document.add_paragraph(f"Table {page + 1}")
+        _add_table(document, rng, 12, 5)
+
+
+def _build_headings(document, rng, pages):
+    document.add_paragraph("目录")
+    for page in range(pages):
+        if page % 10 == 0:
+            document.add_heading(f"第{page // 10 + 1}章 {_latin(rng, 3)}", level=1)
+        for section in range(3):
+            document.add_heading(f"{page + 1}.{section + 1} {_latin(rng, 4)}", level=2)
+            document.add_heading(_latin(rng, 5), level=3)
+            document.add_paragraph(_latin(rng, 40))
+            document.add_paragraph(_cjk(rng, 60))
+
+
+def _noise_image(rng, size, fmt, **save_args):
+    from PIL import Image
+
+    image = Image.effect_noise(size, rng.randint(20, 80)).convert('RGB')
+    data = io.BytesIO()
+    image.save(data, fmt, **save_args)
+    data.seek(0)
+    return data
+
+
+def _build_images(document, rng, pages):
+    """扫描件类文档: 每页一张整页的大JPEG，加上重复出现的logo"""
+    from docx.shared import Inches
+
+    logo = _noise_image(rng, (400, 120), 'PNG').getvalue()
+    scans = [_noise_image(rng, (1700, 2200), 'JPEG', quality=80).getvalue() for _ in range(min(pages, 5))]
+    for page in range(pages):
+        document.add_paragraph().add_run().add_picture(io.BytesIO(logo), width=Inches(1.5))
+        document.add_picture(io.BytesIO(scans[page % len(scans)]), width=Inches(5.5))
+
+
+def _build_mixed(document, rng, pages):
+    document.add_paragraph("目录")
+    for page in range(pages):
+        if page % 5 == 0:
+            document.add_heading(f"Part {page // 5 + 1}", level=1)
+        document.add_heading(_latin(rng, 4), level=2)
+        document.add_paragraph(_latin(rng, 50))
+        p = document.add_paragraph()
+        p.add_run(_cjk(rng, 80))
+        p.add_run(_latin(rng, 8)).italic = True
+        _add_table(document, rng, 8, 4, cjk=page % 2 == 1)
+
+
+_BUILDERS = {
+    'paragraphs': _build_paragraphs,
+    'cjk': _build_cjk,
+    'tables': _build_tables,
+    'headings': _build_headings,
+    'images': _build_images,
+    'mixed': _build_mixed,
+}
+
+
+def scenario_name(kind, pages):
+    return f"{kind}-{pages}p"
+
+
+def generate_document(kind, pages, path, seed=0):
+    """生成约pages页的测试文档，相同参数生成的内容相同"""
+    from docx import Document
+
+    rng = random.Random(f"{kind}-{pages}-{seed}")
+    document = Document()
+    _BUILDERS[kind](document, rng, pages)
+    tmp_path = path + '.tmp'
+    document.save(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def ensure_corpus(corpus_dir, kind, pages):
+    """返回测试文档路径，已生成的文档直接复用"""
+    os.makedirs(corpus_dir, exist_ok=True)
+    path = os.path.join(corpus_dir, f"{scenario_name(kind, pages)}-v{CORPUS_VERSION}.docx")
+    if not os.path.exists(path):
+        generate_document(kind, pages, path)
+    return path
+
+
+def peak_memory_mb():
+    """
+    当前进程的峰值常驻内存（MB），无法获取时返回None
+    Linux下优先读取VmHWM: ru_maxrss在exec后保留父进程的峰值，spawn的子进程会被高估
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            with open('/proc/self/status', encoding='ascii') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            info = psutil.Process().memory_info()
+            return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+        except ImportError:
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_scenario(docx_path, repeat=3, streaming=True, render_workers=0, output_profile=DEFAULT_OUTPUT_PROFILE,
+                 in_memory=False):
+    """
+    在子进程中执行: 预加载字体后转换repeat次，返回各项指标
+    每个场景使用新的进程，峰值内存不受其他场景影响
+    in_memory: PDF写入io.BytesIO，不写入文件
+    """
+    import font_registry
+    # 排版模块按需导入，不计入转换耗时
+    importlib.import_module('reportlab_renderer')
+    from conversion_engine import convert_file
+    from conversion_options import ConversionOptions
+
+    start = time.perf_counter()
+    font_registry.preload()
+    font_seconds = time.perf_counter() - start
+
+    options = ConversionOptions(streaming=streaming, render_workers=render_workers,
+                                output_profile=output_profile, font_stats=True)
+    pdf_path = os.path.splitext(docx_path)[0] + f'-{os.getpid()}.pdf'
+    runs = []
+    result = None
+    try:
+        for _ in range(repeat):
+            output = io.BytesIO() if in_memory else None
+            result = convert_file(docx_path, pdf_path, backends=('reportlab',), options=options, output=output)
+            runs.append(result)
+    finally:
+        if os.path.exists(pdf_path):
+            os.remove(pdf_path)
+
+    times = [r.seconds for r in runs]
+    fastest = min(runs, key=lambda r: r.seconds)
+    median = statistics.median(times)
+    return {
+        'seconds': round(median, 4),
+        'min_seconds': round(min(times), 4),
+        'pages': result.pages,
+        'pages_per_sec': round(result.pages / median, 2) if median else None,
+        'peak_rss_mb': round(peak_memory_mb() or 0, 1) or None,
+        'input_bytes': os.path.getsize(docx_path),
+        'output_bytes': result.output_bytes,
+        'bytes_per_page': round(result.output_bytes / result.pages) if result.pages else None,
+        'font_bytes': sum(value for name, value in fastest.trace['counters'].items()
+                          if name.startswith('font.') and name.endswith('.bytes')),
+        'font_seconds': round(font_seconds, 4),
+        'font_fallback': result.font_fallback,
+        'trace': fastest.trace,
+    }
+
+
+def run_benchmarks(kinds=SCENARIOS, sizes=DEFAULT_SIZES, corpus_dir=None, repeat=3,
+                   streaming=True, on_result=None, render_workers=0, output_profile=DEFAULT_OUTPUT_PROFILE,
+                   in_memory=False):
+    """
+    生成测试文档并逐个场景运行，返回{场景名: 指标}
+    render_workers大于1时测试分段并行排版（峰值内存只包含主进程）
+    output_profile、in_memory: 输出配置和是否写入内存，见run_scenario
+    """
+    corpus_dir = corpus_dir or default_corpus_dir()
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for pages in sizes:
+        for kind in kinds:
+            name = scenario_name(kind, pages)
+            docx_path = ensure_corpus(corpus_dir, kind, pages)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                metrics = pool.submit(run_scenario, docx_path, repeat, streaming, render_workers,
+                                      output_profile, in_memory).result()
+            results[name] = metrics
+            if on_result:
+                on_result(name, metrics)
+    return results
+
+
+def parse_importtime(output):
+    """解析-X importtime的输出，返回[(模块名, 自身耗时us, 累计耗时us)]"""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        modules.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return modules
+
+
+def measure_startup(repeat=5):
+    """
+    测量STARTUP_COMMANDS的耗时，并检查导入转换引擎时加载了哪些LAZY_MODULES
+    先编译本目录的.pyc，与正常安装后的运行状态一致
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    compileall.compile_dir(here, maxlevels=0, quiet=1)
+    commands = {}
+    for name, args in STARTUP_COMMANDS.items():
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + args, cwd=here, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+        commands[name] = round(min(times) * 1000, 1)
+
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import conversion_engine'],
+                            cwd=here, check=True, capture_output=True, text=True).stderr
+    modules = parse_importtime(output)
+    loaded = {name.split('.')[0] for name, _, _ in modules}
+    return {
+        'commands': commands,
+        'import_ms': round(max((total for _, _, total in modules), default=0) / 1000, 1),
+        'eager_modules': [name for name in LAZY_MODULES if name in loaded],
+    }
+
+
+def compare_startup(startup, baseline, threshold=DEFAULT_THRESHOLD, min_delta=STARTUP_MIN_DELTA_MS):
+    """启动耗时超过上限或基线、导入了LAZY_MODULES时返回回退列表，格式同compare()"""
+    regressions = []
+    base_commands = (baseline or {}).get('commands', {})
+    for name, ms in startup['commands'].items():
+        if ms > STARTUP_BUDGET_MS:
+            regressions.append((f'startup.{name}', 'ms', STARTUP_BUDGET_MS, ms))
+        base = base_commands.get(name)
+        if base and ms > base * (1 + threshold) and ms - base > min_delta:
+            regressions.append((f'startup.{name}', 'ms', base, ms))
+    for name in startup['eager_modules']:
+        regressions.append(('startup', 'eager_import', None, name))
+    return regressions
+
+
+def environment_info():
+    import reportlab
+    import docx
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'reportlab': reportlab.Version,
+        'python_docx': getattr(docx, '__version__', None),
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD,
+            memory_threshold=DEFAULT_MEMORY_THRESHOLD, min_delta=DEFAULT_MIN_DELTA):
+    """
+    与基线比较，返回回退列表[(场景名, 指标, 基线值, 当前值)]
+    只比较两边都有的场景
+    """
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if (metrics['seconds'] > base['seconds'] * (1 + threshold)
+                and metrics['seconds'] - base['seconds'] > min_delta):
+            regressions.append((name, 'seconds', base['seconds'], metrics['seconds']))
+        if (metrics.get('peak_rss_mb') and base.get('peak_rss_mb')
+                and metrics['peak_rss_mb'] > base['peak_rss_mb'] * (1 + memory_threshold)):
+            regressions.append((name, 'peak_rss_mb', base['peak_rss_mb'], metrics['peak_rss_mb']))
+    return regressions
+
+
+def _format_row(name, metrics, base=None):
+    line = (f"{name:<18} {metrics['seconds']:>9.3f}s {metrics['pages']:>6}页 "
+            f"{metrics['pages_per_sec'] or 0:>9.1f}页/秒 {metrics['peak_rss_mb'] or 0:>8.1f}MB "
+            f"{metrics['output_bytes'] / 1024:>10.1f}KB "
+            f"{(metrics.get('bytes_per_page') or 0) / 1024:>8.1f}KB/页")
+    if base:
+        change = (metrics['seconds'] / base['seconds'] - 1) * 100 if base['seconds'] else 0.0
+        line += f"  ({change:+.1f}%)"
+    return line
+
+
+def _parse_list(value, allowed=None):
+    items = [item.strip() for item in value.split(',') if item.strip()]
+    if allowed is not None:
+        selected = [kind for kind in allowed if any(fnmatch.fnmatch(kind, item) for item in items)]
+        if not selected:
+            raise argparse.ArgumentTypeError(f"未知的场景: {value}，可选: {','.join(allowed)}")
+        return selected
+    return [int(item) for item in items]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Word转PDF基准测试")
+    parser.add_argument('-s', '--scenarios', default=','.join(SCENARIOS),
+                        type=lambda v: _parse_list(v, SCENARIOS),
+                        help="场景，逗号分隔，支持通配符，可选: " + ','.join(SCENARIOS))
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), type=_parse_list,
+                        help="文档页数，逗号分隔")
+    parser.add_argument('-n', '--repeat', type=int, default=3, help="每个场景的转换次数，取中位数")
+    parser.add_argument('--corpus-dir', default=None, help="测试文档目录，默认在系统临时目录下")
+    parser.add_argument('--no-stream', action='store_true', help="关闭流式转换")
+    parser.add_argument('--render-workers', type=int, default=0, help="分段并行排版的进程数，0表示不分段")
+    parser.add_argument('--output-profile', choices=list(OUTPUT_PROFILES), default=DEFAULT_OUTPUT_PROFILE,
+                        help="输出配置（压缩方式）")
+    parser.add_argument('--in-memory', action='store_true', help="PDF写入内存，不写入文件")
+    parser.add_argument('-o', '--output', help="将本次结果写入JSON文件")
+    parser.add_argument('--baseline', help="基线JSON文件")
+    parser.add_argument('--save-baseline', action='store_true', help="将本次结果保存为基线")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="耗时超过基线的比例，默认0.25")
+    parser.add_argument('--memory-threshold', type=float, default=DEFAULT_MEMORY_THRESHOLD,
+                        help="峰值内存超过基线的比例，默认0.25")
+    parser.add_argument('--min-delta', type=float, default=DEFAULT_MIN_DELTA,
+                        help="耗时增加少于该秒数时不算回退")
+    parser.add_argument('--startup-only', action='store_true', help="只测量启动耗时")
+    parser.add_argument('--no-startup', action='store_true', help="不测量启动耗时")
+    args = parser.parse_args(argv)
+    if args.save_baseline and not args.baseline:
+        parser.error("--save-baseline需要同时指定--baseline")
+
+    baseline = {}
+    baseline_startup = {}
+    if args.baseline and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            saved = json.load(f)
+        baseline = saved.get('scenarios', {})
+        baseline_startup = saved.get('startup') or {}
+
+    startup = None
+    if not args.no_startup:
+        startup = measure_startup(max(args.repeat, 5))
+        for name, ms in startup['commands'].items():
+            print(f"启动 {name:<14} {ms:>8.1f}ms", flush=True)
+        print(f"导入conversion_engine {startup['import_ms']}ms (-X importtime)")
+        if startup['eager_modules']:
+            print(f"启动时导入了: {', '.join(startup['eager_modules'])}")
+
+    results = {}
+    if not args.startup_only:
+        print(f"{'场景':<16} {'耗时':>10} {'页数':>7} {'速度':>11} {'峰值内存':>8} {'输出大小':>10} {'每页':>8}")
+
+        def on_result(name, metrics):
+            print(_format_row(name, metrics, baseline.get(name)), flush=True)
+
+        results = run_benchmarks(args.scenarios, args.sizes, args.corpus_dir, args.repeat,
+                                 streaming=not args.no_stream, on_result=on_result,
+                                 render_workers=args.render_workers, output_profile=args.output_profile,
+                                 in_memory=args.in_memory)
+    data = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': environment_info(),
+        'repeat': args.repeat,
+        'streaming': not args.no_stream,
+        'render_workers': args.render_workers,
+        'output_profile': args.output_profile,
+        'in_memory': args.in_memory,
+        'startup': startup,
+        'scenarios': results,
+    }
+
+    for path in filter(None, (args.output, args.baseline if args.save_baseline else None)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        print(f"基线已保存: {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold, args.memory_threshold, args.min_delta)
+    if startup:
+        regressions += compare_startup(startup, baseline_startup, args.threshold)
+    for name, metric, before, after in regressions:
+        print(f"性能回退: {name} {metric} {before} -> {after}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,12 @@
 pip install docx2pdf
 pip install pyinstaller
 
-pyinstaller --onefile --windowed --noconsole --name "WordToPdfConverter_new" word_to_pdf_converter.py
+rem --onedir: 启动时不再把全部依赖解压到临时目录，比--onefile启动快得多，发布时分发整个dist目录；
+rem reportlab、python-docx在转换时才导入，窗口和命令行帮助不等待它们加载
+pyinstaller --noconfirm --onedir --windowed --noconsole --name "WordToPdfConverter_new" word_to_pdf_converter.py
+
+rem 命令行批量转换和监视目录
+pyinstaller --noconfirm --onedir --console --name "word2pdf" conversion_engine.py
+pyinstaller --noconfirm --onedir --console --name "word2pdf-watch" watch_folder.py
 
 echo 打包完成！
\ No newline at end of file
@@ -0,0 +1,227 @@
+"""
+基于内容寻址的PDF转换缓存
+
+缓存键为Word文件内容的SHA-256，加上转换器版本、字体和影响输出的转换选项，
+命中时直接复制已生成的PDF，不再解析文档和排版。
+缓存大小超过上限时按最近使用时间（文件修改时间，命中时刷新）淘汰最旧的条目。
+多个进程可以共用同一个缓存目录，写入使用临时文件加重命名，不会读到写了一半的PDF。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+# 默认缓存上限 1GB
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def default_cache_dir():
+    """
+    默认缓存目录，可通过环境变量WORD2PDF_CACHE_DIR指定
+    Windows下位于%LOCALAPPDATA%，其他系统位于$XDG_CACHE_HOME或~/.cache
+    """
+    override = os.environ.get('WORD2PDF_CACHE_DIR')
+    if override:
+        return override
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'word2pdf')
+
+
+def file_digest(path):
+    """分块计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy_atomic(src, dst):
+    """
+    复制到目标目录中的临时文件后重命名，src为文件路径或PDF内容（bytes）
+    临时文件按umask的默认权限创建，不使用mkstemp（只有属主可读写），命中缓存时输出的PDF权限不变
+    """
+    directory, name = os.path.split(dst)
+    tmp_path = os.path.join(directory, f'.{name}.{os.urandom(6).hex()}.tmp')
+    try:
+        with open(tmp_path, 'xb') as out:
+            if isinstance(src, bytes):
+                out.write(src)
+            else:
+                with open(src, 'rb') as f:
+                    shutil.copyfileobj(f, out, _CHUNK_SIZE)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class CacheStats:
+    """当前进程内的缓存统计"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.hit_seconds = 0.0
+
+    def to_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'avg_hit_ms': round(self.hit_seconds * 1000 / self.hits, 2) if self.hits else 0.0,
+        }
+
+
+class ConversionCache:
+    """
+    磁盘上的PDF缓存
+    cache_dir: 缓存目录，默认为default_cache_dir()
+    max_bytes: 缓存总大小上限，超出时淘汰最久未使用的条目
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._size_estimate = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # 传给工作进程时只保留配置，统计和锁在各进程中重新创建
+        return {'cache_dir': self.cache_dir, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state['cache_dir'], state['max_bytes'])
+
+    @property
+    def objects_dir(self):
+        return os.path.join(self.cache_dir, 'objects')
+
+    def key_for(self, file_path, context):
+        """
+        计算缓存键
+        context: 转换器版本、字体、转换方法和输出选项等影响PDF内容的信息（可JSON序列化）
+        """
+        digest = hashlib.sha256()
+        digest.update(file_digest(file_path).encode('ascii'))
+        digest.update(json.dumps(context, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entry_paths(self, key):
+        directory = os.path.join(self.objects_dir, key[:2])
+        return os.path.join(directory, key + '.pdf'), os.path.join(directory, key + '.json')
+
+    def fetch(self, key, pdf_path):
+        """
+        命中时将缓存的PDF复制到pdf_path并返回条目的元数据，未命中返回None
+        pdf_path也可以是可写的二进制流，缓存的PDF整体读出后再写入，读取失败时不会写入一部分
+        """
+        start = time.perf_counter()
+        entry_pdf, entry_meta = self._entry_paths(key)
+        stream = hasattr(pdf_path, 'write')
+        try:
+            with open(entry_meta, encoding='utf-8') as f:
+                meta = json.load(f)
+            if stream:
+                with open(entry_pdf, 'rb') as f:
+                    data = f.read()
+            else:
+                _copy_atomic(entry_pdf, pdf_path)
+            # 刷新修改时间，作为LRU的使用时间
+            os.utime(entry_pdf)
+        except (OSError, ValueError):
+            self.stats.misses += 1
+            return None
+        if stream:
+            # 写入调用方的流失败（如客户端断开）不是缓存未命中，异常交给调用方
+            pdf_path.write(data)
+        self.stats.hits += 1
+        self.stats.hit_seconds += time.perf_counter() - start
+        return meta
+
+    def store(self, key, pdf_path, meta=None):
+        """将生成的PDF（文件路径或内容bytes）存入缓存，缓存写入失败不影响转换结果"""
+        entry_pdf, entry_meta = self._entry_paths(key)
+        try:
+            os.makedirs(os.path.dirname(entry_pdf), exist_ok=True)
+            _copy_atomic(pdf_path, entry_pdf)
+            with open(entry_meta + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(meta or {}, f, ensure_ascii=False)
+            os.replace(entry_meta + '.tmp', entry_meta)
+        except OSError:
+            return False
+        self.stats.stores += 1
+
+        with self._lock:
+            if self._size_estimate is None:
+                self._size_estimate = self.total_bytes()
+            else:
+                self._size_estimate += os.path.getsize(entry_pdf)
+            if self._size_estimate > self.max_bytes:
+                self.evict()
+        return True
+
+    def _entries(self):
+        """返回[(修改时间, 大小, PDF路径)]"""
+        entries = []
+        if not os.path.isdir(self.objects_dir):
+            return entries
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for name in filenames:
+                if name.endswith('.pdf'):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def total_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """淘汰最久未使用的条目，直到总大小不超过上限的90%"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            for entry_path in (path, path[:-4] + '.json'):
+                try:
+                    os.remove(entry_path)
+                except OSError:
+                    pass
+            total -= size
+            self.stats.evictions += 1
+        self._size_estimate = total
+
+    def clear(self):
+        shutil.rmtree(self.objects_dir, ignore_errors=True)
+        self._size_estimate = 0
+
+    def info(self):
+        """缓存目录、条目数和总大小"""
+        entries = self._entries()
+        return {
+            'cache_dir': self.cache_dir,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
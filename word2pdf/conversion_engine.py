@@ -0,0 +1,729 @@
+"""
+Word转PDF无界面转换引擎
+
+将python-docx → reportlab的转换流程从Tk界面中独立出来，提供:
+1. convert_file: 按 docx2pdf → WPS → LibreOffice → reportlab 的优先级转换单个文件
+2. convert_batch: 使用进程池并行转换目录或文件列表，支持单文件超时和汇总报告
+3. main: 命令行入口，例如:
+   python conversion_engine.py D:\\docs -r -w 8 --timeout 120 --report report.json
+   python conversion_engine.py --list-backends
+
+reportlab、python-docx和docx2pdf在对应的转换方法实际执行时才导入，
+解析参数、查看帮助和探测可用的转换方法不承担这些导入开销。
+"""
+import io
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import tempfile
+import threading
+import importlib.util
+
+import font_registry
+from conversion_cache import ConversionCache, DEFAULT_MAX_BYTES
+from instrumentation import ConversionTrace, JsonLinesLogger
+from conversion_options import ConversionOptions, DEFAULT_DPI, add_output_arguments, output_arguments
+from conversion_errors import ConversionError, ConversionTimeout, check_cancel
+
+# docx2pdf作为备用转换方法；只检查是否安装，使用时才导入
+USE_DOCX2PDF = importlib.util.find_spec('docx2pdf') is not None
+
+# 转换器版本，输出内容变化时递增，使旧的缓存失效
+CONVERTER_VERSION = '2.4'
+
+# 默认的转换方法优先级（界面使用），不可用的方法会直接跳过
+DEFAULT_BACKENDS = ('docx2pdf', 'wps', 'libreoffice', 'reportlab')
+
+# 批量转换和转换服务: docx2pdf/WPS依赖桌面程序，不适合多进程并发；
+# LibreOffice每个进程使用独立的实例和配置目录，未安装或失败时回退到reportlab
+BATCH_BACKENDS = ('libreoffice', 'reportlab')
+
+# WPS可能的安装位置
+WPS_PATHS = [
+    "C:\\Program Files\\Kingsoft\\WPS Office\\11.2.0.12841\\office6\\wps.exe",
+    "C:\\Program Files (x86)\\Kingsoft\\WPS Office\\11.2.0.12841\\office6\\wps.exe",
+    "C:\\Program Files\\Kingsoft\\WPS Office\\office6\\wps.exe",
+    "C:\\Program Files (x86)\\Kingsoft\\WPS Office\\office6\\wps.exe"
+]
+
+
+class ConversionResult:
+    """单个文件的转换结果"""
+
+    def __init__(self, source, pdf_path, success=False, backend=None, error=None,
+                 seconds=0.0, pages=None, output_bytes=0, timed_out=False, font_fallback=False,
+                 cache_hit=False, trace=None, data=None):
+        self.source = source
+        self.pdf_path = pdf_path
+        self.success = success
+        self.backend = backend
+        self.error = error
+        self.seconds = seconds
+        self.pages = pages
+        self.output_bytes = output_bytes
+        self.timed_out = timed_out
+        # reportlab转换时未找到中文字体
+        self.font_fallback = font_fallback
+        self.cache_hit = cache_hit
+        # 各阶段耗时和计数，见ConversionTrace.to_dict()
+        self.trace = trace
+        # 输出到内存时的PDF内容（见convert_in_worker），不包含在to_dict()中
+        self.data = data
+
+    def to_dict(self):
+        result = dict(self.__dict__)
+        del result['data']
+        return result
+
+
+def _noop(message):
+    pass
+
+
+def _pdf_ok(pdf_path):
+    """验证PDF文件是否成功创建且不为空"""
+    return os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0
+
+
+def _temp_pdf_path(pdf_path):
+    """
+    目标PDF所在目录中的临时文件名，转换成功后重命名为目标文件
+    文件由转换方法创建，权限与直接写入目标文件相同（mkstemp创建的文件只有属主可读写）
+    """
+    directory, name = os.path.split(pdf_path)
+    name = os.path.splitext(name)[0]
+    return os.path.join(directory, f'.{name}.{os.urandom(6).hex()}.tmp.pdf')
+
+
+def _replace_pdf(tmp_path, pdf_path):
+    """用转换结果原子地替换目标PDF"""
+    try:
+        os.replace(tmp_path, pdf_path)
+    except PermissionError:
+        # Windows下目标文件被其他程序打开时无法替换
+        raise ConversionError(f"无法替换PDF文件，可能已被其他程序打开: {pdf_path}")
+
+
+def convert_with_docx2pdf(file_path, pdf_path, log=_noop):
+    """使用docx2pdf（调用Word）转换，成功返回True"""
+    if not USE_DOCX2PDF:
+        log("docx2pdf不可用(未安装)")
+        return False
+    try:
+        log("尝试使用docx2pdf转换")
+        import docx2pdf
+
+        # 确保目标PDF路径存在
+        if os.path.exists(pdf_path):
+            log(f"删除已存在的PDF文件: {pdf_path}")
+            os.remove(pdf_path)
+
+        docx2pdf.convert(file_path, pdf_path)
+
+        if _pdf_ok(pdf_path):
+            log(f"docx2pdf转换成功: {pdf_path}")
+            return True
+        log("docx2pdf转换失败: PDF文件不存在或为空")
+    except ConversionError:
+        # 超时、取消需传给调用方
+        raise
+    except Exception as docx2pdf_error:
+        log(f"docx2pdf转换失败: {str(docx2pdf_error)}")
+        # 如果有具体的错误信息，记录更多详情
+        if hasattr(docx2pdf_error, 'args'):
+            log(f"docx2pdf错误详情: {docx2pdf_error.args}")
+    return False
+
+
+def convert_with_wps(file_path, pdf_path, log=_noop):
+    """使用WPS命令行转换，成功返回True"""
+    try:
+        log("尝试使用WPS命令行转换")
+
+        wps_path = None
+        for path in WPS_PATHS:
+            if os.path.exists(path):
+                wps_path = path
+                break
+
+        if not wps_path:
+            log("WPS未找到")
+            return False
+
+        import subprocess
+
+        cmd = [wps_path, "-convert", pdf_path, file_path]
+        subprocess.run(cmd, check=True, timeout=60)
+
+        if _pdf_ok(pdf_path):
+            log(f"WPS转换成功: {pdf_path}")
+            return True
+        log("WPS转换失败: PDF文件不存在或为空")
+    except ConversionError:
+        raise
+    except Exception as wps_error:
+        log(f"WPS转换失败: {str(wps_error)}")
+    return False
+
+
+def convert_with_libreoffice(file_path, pdf_path, log=_noop):
+    """使用LibreOffice实例池转换，成功返回True（libreoffice_backend在首次使用时导入）"""
+    import libreoffice_backend
+
+    return libreoffice_backend.convert_with_libreoffice(file_path, pdf_path, log=log)
+
+
+# 转换方法: 名称 -> func(file_path, pdf_path, log)，成功返回True，失败返回False以尝试下一个方法
+# reportlab需要进度、取消和选项参数，在convert_file中单独处理
+BACKEND_FUNCTIONS = {
+    'docx2pdf': convert_with_docx2pdf,
+    'wps': convert_with_wps,
+    'libreoffice': convert_with_libreoffice,
+}
+
+BACKEND_LABELS = {
+    'docx2pdf': "使用docx2pdf转换...",
+    'wps': "使用WPS转换...",
+    'libreoffice': "使用LibreOffice转换...",
+    'reportlab': "使用reportlab转换...",
+}
+
+
+def register_backend(name, func, label=None):
+    """
+    注册转换方法，之后可在backends中按名称使用
+    func: func(file_path, pdf_path, log)，成功返回True
+    """
+    BACKEND_FUNCTIONS[name] = func
+    BACKEND_LABELS[name] = label or f"使用{name}转换..."
+
+
+def probe_backends():
+    """
+    检查各转换方法是否可用，返回{名称: 说明}，不可用时说明为None
+    只检查包和程序是否存在，不导入转换依赖的模块
+    """
+    from libreoffice_backend import find_soffice
+
+    wps = next((path for path in WPS_PATHS if os.path.exists(path)), None)
+    reportlab = all(importlib.util.find_spec(name) is not None for name in ('reportlab', 'docx'))
+    backends = {
+        'docx2pdf': "docx2pdf（需要Microsoft Word）" if USE_DOCX2PDF else None,
+        'wps': wps,
+        'libreoffice': find_soffice(),
+        'reportlab': "reportlab + python-docx" if reportlab else None,
+    }
+    for name in BACKEND_FUNCTIONS:
+        backends.setdefault(name, "已注册")
+    return backends
+
+
+def preload_worker(backends):
+    """
+    预先导入转换方法需要的模块并加载字体，第一个文件不再承担导入开销
+    在创建进程池前调用时fork出的工作进程直接继承；也可作为进程池的initializer（spawn）
+    """
+    if 'reportlab' in backends:
+        importlib.import_module('reportlab_renderer')
+        font_registry.preload()
+
+
+def default_pdf_path(file_path, output_dir=None, base_dir=None):
+    """
+    计算输出PDF路径；未指定输出目录时与源文件同目录，
+    指定时按相对base_dir的目录结构放入output_dir
+    """
+    stem = os.path.splitext(file_path)[0]
+    if not output_dir:
+        return stem + ".pdf"
+    if base_dir:
+        rel = os.path.relpath(stem, base_dir)
+    else:
+        rel = os.path.basename(stem)
+    return os.path.join(output_dir, rel + ".pdf")
+
+
+def cache_context(backends, options=None):
+    """影响输出PDF的全部信息，作为缓存键的一部分"""
+    options = options or ConversionOptions()
+    return {
+        'version': CONVERTER_VERSION,
+        'backends': list(backends),
+        'fonts': font_registry.fingerprint() if 'reportlab' in backends else None,
+        'options': options.output_settings(),
+    }
+
+
+def convert_file(file_path, pdf_path=None, backends=DEFAULT_BACKENDS, log=_noop, progress=_noop,
+                 cancel_event=None, options=None, cache=None, trace=None, output=None):
+    """
+    按backends的顺序依次尝试转换方法，返回ConversionResult；
+    所有方法都失败时抛出ConversionError
+    log: 接收调试信息的回调
+    progress: 接收界面状态文本的回调
+    cancel_event: threading.Event，设置后在段落/页面之间中止转换
+    options: reportlab转换选项ConversionOptions
+    cache: ConversionCache，命中时直接复制缓存的PDF
+    trace: ConversionTrace，记录各阶段耗时和计数，结果中以字典形式返回
+    output: 可写的二进制流（如io.BytesIO），指定时PDF写入该流，不生成pdf_path；
+            reportlab直接写入，其他转换方法只能生成文件，写入临时文件后复制
+    """
+    start = time.perf_counter()
+    trace = trace or ConversionTrace()
+    if not os.path.exists(file_path):
+        raise ConversionError("所选文件不存在")
+
+    if output is not None:
+        # 临时文件放在系统临时目录
+        pdf_path = None
+        tmp_dir = tempfile.gettempdir()
+    else:
+        if pdf_path is None:
+            pdf_path = default_pdf_path(file_path)
+
+        # 验证PDF路径是否可写
+        tmp_dir = os.path.dirname(pdf_path) or os.getcwd()
+        os.makedirs(tmp_dir, exist_ok=True)
+        if not os.access(tmp_dir, os.W_OK):
+            raise ConversionError(f"没有写入权限: {tmp_dir}")
+
+    result = ConversionResult(file_path, pdf_path)
+    trace.count('bytes_read', os.path.getsize(file_path))
+
+    cache_key = None
+    if cache is not None:
+        progress("正在检查转换缓存...")
+        with trace.span('cache_lookup'):
+            cache_key = cache.key_for(file_path, cache_context(backends, options))
+            meta = cache.fetch(cache_key, pdf_path if output is None else output)
+        if meta is not None:
+            log(f"命中转换缓存: {cache_key}")
+            result.success = True
+            result.cache_hit = True
+            result.backend = meta.get('backend')
+            result.pages = meta.get('pages')
+            result.font_fallback = meta.get('font_fallback', False)
+            result.output_bytes = meta.get('output_bytes', 0)
+            if not result.output_bytes and pdf_path is not None:
+                result.output_bytes = os.path.getsize(pdf_path)
+            result.seconds = time.perf_counter() - start
+            result.trace = trace.to_dict()
+            return result
+        log("未命中转换缓存")
+
+    # 先写入同目录的临时文件，成功后重命名，转换失败或中止时保留原有的PDF，
+    # 其他程序（如同步工具、监视模式的下游）不会读到写了一半的文件
+    tmp_path = _temp_pdf_path(os.path.join(tmp_dir, os.path.basename(pdf_path or file_path)))
+    try:
+        for backend in backends:
+            check_cancel(cancel_event)
+            progress(BACKEND_LABELS.get(backend, "正在转换..."))
+            data = None
+            if backend == 'reportlab':
+                log("尝试使用reportlab转换")
+                from reportlab_renderer import convert_with_reportlab
+                # 写入流时先在内存中生成，成功后再写入调用方的流，需要存入缓存时也不必再读取
+                target = io.BytesIO() if output is not None else tmp_path
+                written = trace.counters.get('bytes_written', 0)
+                with trace.span('backend.reportlab'):
+                    result.pages = convert_with_reportlab(file_path, target, log=log, progress=progress,
+                                                          cancel_event=cancel_event, options=options,
+                                                          trace=trace)
+                result.font_fallback = font_registry.get_registry().fallback
+                result.output_bytes = trace.counters['bytes_written'] - written
+                if output is not None:
+                    data = target.getvalue()
+                converted = True
+            elif backend in BACKEND_FUNCTIONS:
+                with trace.span(f'backend.{backend}'):
+                    converted = BACKEND_FUNCTIONS[backend](file_path, tmp_path, log=log)
+                if converted:
+                    result.output_bytes = os.path.getsize(tmp_path)
+                    if output is not None:
+                        with open(tmp_path, 'rb') as f:
+                            data = f.read()
+            else:
+                raise ConversionError(f"未知的转换方法: {backend}")
+
+            if converted:
+                if output is None:
+                    _replace_pdf(tmp_path, pdf_path)
+                else:
+                    with trace.span('write_output'):
+                        output.write(data)
+                result.success = True
+                result.backend = backend
+                if cache_key is not None:
+                    with trace.span('cache_store'):
+                        cache.store(cache_key, pdf_path if data is None else data, {
+                            'backend': backend,
+                            'pages': result.pages,
+                            'font_fallback': result.font_fallback,
+                            'output_bytes': result.output_bytes,
+                            'source': os.path.basename(file_path),
+                        })
+                result.seconds = time.perf_counter() - start
+                result.trace = trace.to_dict()
+                return result
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    raise ConversionError("所有转换方法均失败")
+
+
+def is_docx_file(name):
+    """是否为需要转换的Word文件（忽略~$开头的Word临时文件）"""
+    return name.lower().endswith('.docx') and not name.startswith('~$')
+
+
+def collect_docx_files(inputs, recursive=False):
+    """
+    展开命令行输入：目录中收集.docx文件（忽略~$开头的Word临时文件），文件原样保留
+    返回[(文件路径, 所属输入目录或None)]
+    """
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            if recursive:
+                walker = os.walk(item)
+            else:
+                walker = [(item, [], os.listdir(item))]
+            for dirpath, _, filenames in walker:
+                for name in sorted(filenames):
+                    if is_docx_file(name):
+                        files.append((os.path.join(dirpath, name), item))
+        else:
+            files.append((item, None))
+    return files
+
+
+# 线程方式超时后等待转换在下一个取消检查点退出、清理临时文件的时间（秒）
+CANCEL_GRACE_SECONDS = 5
+
+
+def _run_with_timeout(func, timeout, cancel_event=None):
+    """
+    在限定时间内执行func；支持SIGALRM的平台直接中断，
+    否则在线程中执行，超时后设置cancel_event通知func中止，并短暂等待其退出
+    """
+    if not timeout:
+        return func()
+
+    if hasattr(signal, 'SIGALRM'):
+        fired = []
+
+        def handler(signum, frame):
+            fired.append(signum)
+            # 超时异常被转换方法吞掉时，后续的转换方法在取消检查点中止
+            if cancel_event is not None:
+                cancel_event.set()
+            raise ConversionTimeout("转换超时")
+
+        previous = signal.signal(signal.SIGALRM, handler)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            result = func()
+        except Exception:
+            # 超时异常可能被转换流程包装成其他错误
+            if fired:
+                raise ConversionTimeout("转换超时")
+            raise
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+        # 超时异常被吞掉（如转换方法捕获后改用下一个方法）时，结果也不能算作在时限内完成
+        if fired:
+            raise ConversionTimeout("转换超时")
+        return result
+
+    outcome = {}
+
+    def target():
+        try:
+            outcome['value'] = func()
+        except BaseException as e:
+            outcome['error'] = e
+
+    worker = threading.Thread(target=target, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        if cancel_event is not None:
+            cancel_event.set()
+            worker.join(CANCEL_GRACE_SECONDS)
+        raise ConversionTimeout("转换超时")
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['value']
+
+
+def convert_in_worker(file_path, pdf_path, backends, timeout, options, cache, in_memory=False):
+    """
+    进程池中执行的单文件转换（批量转换和转换服务共用），
+    异常转换为失败结果返回（保留已记录的阶段耗时）
+    in_memory: 不写入pdf_path，PDF内容随结果（ConversionResult.data）返回给调用进程
+    """
+    start = time.perf_counter()
+    trace = ConversionTrace()
+    # 超时后由此通知转换中止，临时文件由convert_file清理
+    cancel_event = threading.Event()
+
+    def convert():
+        if not in_memory:
+            return convert_file(file_path, pdf_path, backends=backends, cancel_event=cancel_event,
+                                options=options, cache=cache, trace=trace)
+        buffer = io.BytesIO()
+        result = convert_file(file_path, backends=backends, cancel_event=cancel_event, options=options,
+                              cache=cache, trace=trace, output=buffer)
+        result.data = buffer.getvalue()
+        return result
+
+    try:
+        return _run_with_timeout(convert, timeout, cancel_event)
+    except ConversionTimeout as e:
+        return ConversionResult(file_path, pdf_path, error=str(e), timed_out=True,
+                                seconds=time.perf_counter() - start, trace=trace.to_dict())
+    except Exception as e:
+        return ConversionResult(file_path, pdf_path, error=str(e),
+                                seconds=time.perf_counter() - start, trace=trace.to_dict())
+
+
+class BatchReport:
+    """批量转换汇总报告"""
+
+    def __init__(self, results, seconds, workers, fonts=None):
+        self.results = results
+        self.seconds = seconds
+        self.workers = workers
+        self.fonts = fonts or {}
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.success]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.success]
+
+    def summary(self):
+        ok = self.succeeded
+        pages = sum(r.pages or 0 for r in ok)
+        elapsed = self.seconds or 1e-9
+        return {
+            'files': len(self.results),
+            'succeeded': len(ok),
+            'failed': len(self.failed),
+            'timed_out': sum(1 for r in self.results if r.timed_out),
+            'workers': self.workers,
+            'seconds': round(self.seconds, 3),
+            'files_per_second': round(len(ok) / elapsed, 3),
+            'pages': pages,
+            'pages_per_second': round(pages / elapsed, 3),
+            'output_bytes': sum(r.output_bytes for r in ok),
+            'font_fallbacks': sum(1 for r in ok if r.font_fallback),
+            'cache_hits': sum(1 for r in ok if r.cache_hit),
+            'backends': self.backend_latency(),
+        }
+
+    def backend_latency(self):
+        """各转换方法的尝试次数、成功次数和平均耗时（包括失败后回退的尝试）"""
+        attempts = {}
+        for r in self.results:
+            spans = (r.trace or {}).get('spans', {})
+            for name, seconds in spans.items():
+                if name.startswith('backend.'):
+                    entry = attempts.setdefault(name[len('backend.'):], [0, 0.0])
+                    entry[0] += 1
+                    entry[1] += seconds
+        return {
+            name: {
+                'attempts': count,
+                'succeeded': sum(1 for r in self.succeeded if r.backend == name and not r.cache_hit),
+                'avg_seconds': round(total / count, 4),
+            }
+            for name, (count, total) in attempts.items()
+        }
+
+    def to_dict(self):
+        return {
+            'summary': self.summary(),
+            'fonts': self.fonts,
+            'results': [r.to_dict() for r in self.results],
+        }
+
+    def format_text(self):
+        s = self.summary()
+        lines = [
+            f"文件总数: {s['files']}  成功: {s['succeeded']}  失败: {s['failed']}  超时: {s['timed_out']}",
+            f"耗时: {s['seconds']}秒  进程数: {s['workers']}",
+            f"吞吐量: {s['files_per_second']} 文件/秒, {s['pages_per_second']} 页/秒",
+        ]
+        if self.fonts:
+            lines.append(f"字体: 正文 {self.fonts['body_font']}, 标题 {self.fonts['heading_font']}, "
+                         f"加载耗时 {self.fonts['timings'].get('total', 0)}秒")
+        for name, stat in s['backends'].items():
+            lines.append(f"转换方法 {name}: 尝试 {stat['attempts']} 次, 成功 {stat['succeeded']} 次, "
+                         f"平均 {stat['avg_seconds']}秒")
+        if s['cache_hits']:
+            lines.append(f"缓存命中: {s['cache_hits']}/{s['files']}")
+        if s['font_fallbacks']:
+            lines.append(f"警告: {s['font_fallbacks']}个文件未找到中文字体，使用Helvetica，中文将显示为方框")
+        for r in self.failed:
+            lines.append(f"失败: {r.source} - {r.error}")
+        return "\n".join(lines)
+
+
+def convert_batch(inputs, workers=None, timeout=None, output_dir=None, recursive=False,
+                  backends=BATCH_BACKENDS, on_result=None, options=None, cache=None):
+    """
+    使用进程池并行转换多个文件
+    inputs: 目录或.docx文件路径列表
+    workers: 进程数，默认为CPU核数
+    timeout: 单个文件的超时秒数
+    on_result: 每完成一个文件时回调，参数为ConversionResult
+    options: reportlab转换选项ConversionOptions
+    cache: ConversionCache，各工作进程共用同一缓存目录
+    返回BatchReport
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    workers = workers or os.cpu_count() or 1
+    files = collect_docx_files(inputs, recursive)
+    start = time.perf_counter()
+    results = []
+
+    # 在创建进程池前导入排版模块并加载字体，fork出的工作进程直接继承；spawn时由initializer加载
+    backends = tuple(backends)
+    preload_worker(backends)
+    fonts = None
+    if 'reportlab' in backends:
+        fonts = font_registry.get_registry().report()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=preload_worker,
+                             initargs=(backends,)) as executor:
+        futures = {}
+        for file_path, base_dir in files:
+            pdf_path = default_pdf_path(file_path, output_dir, base_dir)
+            future = executor.submit(convert_in_worker, file_path, pdf_path, backends,
+                                     timeout, options, cache)
+            futures[future] = (file_path, pdf_path)
+
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # 工作进程异常退出
+                file_path, pdf_path = futures[future]
+                result = ConversionResult(file_path, pdf_path, error=f"工作进程异常: {e}")
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+    return BatchReport(results, time.perf_counter() - start, workers, fonts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Word转PDF批量转换")
+    parser.add_argument('inputs', nargs='*', help="Word文件或包含Word文件的目录")
+    parser.add_argument('-r', '--recursive', action='store_true', help="递归处理子目录")
+    parser.add_argument('-o', '--output-dir', help="PDF输出目录，默认与源文件同目录")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="并行进程数，默认为CPU核数")
+    parser.add_argument('-t', '--timeout', type=float, default=None, help="单个文件超时秒数")
+    parser.add_argument('-b', '--backends', default=','.join(BATCH_BACKENDS),
+                        help="转换方法优先级，逗号分隔，可选: docx2pdf,wps,libreoffice,reportlab")
+    parser.add_argument('--soffice', help="LibreOffice的soffice路径，默认自动查找")
+    parser.add_argument('--lo-instances', type=int, default=None, help="每个进程的LibreOffice实例数")
+    parser.add_argument('--lo-timeout', type=float, default=None, help="LibreOffice单个文件超时秒数")
+    parser.add_argument('--report', help="将汇总报告写入JSON文件")
+    parser.add_argument('-q', '--quiet', action='store_true', help="不逐个输出文件结果")
+    parser.add_argument('--no-stream', action='store_true', help="关闭流式转换，一次性生成全部内容后排版（内存占用更高）")
+    parser.add_argument('--max-memory', type=float, default=None, help="单个转换进程的内存上限(MB)，流式排版时超出则中止该文件的转换")
+    parser.add_argument('--image-dpi', type=int, default=DEFAULT_DPI,
+                        help=f"图片缩小到的分辨率，0表示保留原图，默认{DEFAULT_DPI}")
+    parser.add_argument('--render-workers', type=int, default=0,
+                        help="单个大文档分段并行排版的进程数，0表示不分段（批量转换时建议配合-w 1）")
+    parser.add_argument('--cache-dir', default=None, help="转换缓存目录，默认为用户缓存目录下的word2pdf")
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="转换缓存上限(MB)")
+    parser.add_argument('--no-cache', action='store_true', help="不使用转换缓存")
+    parser.add_argument('--clear-cache', action='store_true', help="清空转换缓存后退出")
+    parser.add_argument('--log', help="以JSON Lines格式记录每个文件的阶段耗时和计数")
+    parser.add_argument('--profile-dir', help="对每个文档做cProfile，结果写入该目录")
+    parser.add_argument('--font-report', action='store_true', help="只输出字体查找结果和加载耗时")
+    parser.add_argument('--list-backends', action='store_true', help="只输出各转换方法是否可用")
+    add_output_arguments(parser)
+    args = parser.parse_args(argv)
+
+    # 通过环境变量传给工作进程中的LibreOffice实例池
+    for name, value in (('WORD2PDF_SOFFICE', args.soffice), ('WORD2PDF_LO_INSTANCES', args.lo_instances),
+                        ('WORD2PDF_LO_TIMEOUT', args.lo_timeout)):
+        if value is not None:
+            os.environ[name] = str(value)
+
+    if args.list_backends:
+        for name, detail in probe_backends().items():
+            print(f"{name:<12} {'可用' if detail else '不可用'}  {detail or ''}".rstrip())
+        return 0
+    if args.font_report:
+        print(json.dumps(font_registry.get_registry().report(), ensure_ascii=False, indent=2))
+        return 0
+    cache = None
+    if not args.no_cache:
+        cache = ConversionCache(args.cache_dir, int(args.cache_size * 1024 * 1024))
+    if args.clear_cache:
+        if cache is not None:
+            cache.clear()
+        return 0
+    if not args.inputs:
+        parser.error("请指定Word文件或包含Word文件的目录")
+
+    logger = JsonLinesLogger(args.log) if args.log else None
+
+    def on_result(result):
+        if logger:
+            logger.emit('conversion', **result.to_dict())
+        if args.quiet:
+            return
+        if result.success:
+            print(f"[成功] {result.source} -> {result.pdf_path} ({result.seconds:.2f}秒)")
+        else:
+            print(f"[失败] {result.source}: {result.error}")
+
+    try:
+        report = convert_batch(
+            args.inputs,
+            workers=args.workers,
+            timeout=args.timeout,
+            output_dir=args.output_dir,
+            recursive=args.recursive,
+            backends=[b.strip() for b in args.backends.split(',') if b.strip()],
+            on_result=on_result,
+            options=ConversionOptions(streaming=not args.no_stream, max_memory_mb=args.max_memory,
+                                      profile_dir=args.profile_dir, image_dpi=args.image_dpi,
+                                      render_workers=args.render_workers, **output_arguments(args)),
+            cache=cache,
+        )
+        if logger:
+            logger.emit('batch_summary', **report.summary())
+    finally:
+        if logger:
+            logger.close()
+
+    print(report.format_text())
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+
+    return 0 if not report.failed else 1
+
+
+if __name__ == "__main__":
+    if getattr(sys, 'frozen', False):
+        # PyInstaller打包后，Windows下进程池的子进程需要
+        import multiprocessing
+        multiprocessing.freeze_support()
+    sys.exit(main())
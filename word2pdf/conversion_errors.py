@@ -0,0 +1,29 @@
+"""
+转换过程中使用的异常类型
+"""
+
+
+class ConversionError(Exception):
+    """转换失败时抛出的异常"""
+
+
+class ConversionTimeout(ConversionError):
+    """单个文件转换超时"""
+
+
+class ConversionCancelled(ConversionError):
+    """转换被用户取消"""
+
+
+class MemoryLimitExceeded(ConversionError):
+    """转换进程内存超过配置的上限"""
+
+
+class ServiceBusy(ConversionError):
+    """转换服务的队列已满"""
+
+
+def check_cancel(cancel_event):
+    """cancel_event（threading.Event）已设置时抛出ConversionCancelled中止转换"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise ConversionCancelled("转换已取消")
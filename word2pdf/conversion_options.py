@@ -0,0 +1,91 @@
+"""
+转换选项
+
+只依赖标准库: 命令行、批量转换和转换服务解析参数时只导入本模块，
+reportlab和python-docx在实际使用reportlab转换时才导入
+"""
+
+# 图片默认目标分辨率（image_cache按此缩小图片）
+DEFAULT_DPI = 150
+
+# 输出配置: 页面内容、字体子集和ToUnicode表的压缩方式，在文件大小和CPU开销之间取舍
+# 图片在插入时由reportlab按zlib默认级别压缩，不受影响
+OUTPUT_PROFILES = {
+    # 与reportlab默认相同（zlib默认级别6）
+    'default': {'page_compression': True, 'compress_level': 6},
+    # 压缩最快，文件略大，适合临时预览和对延迟敏感的服务
+    'fast': {'page_compression': True, 'compress_level': 1},
+    # 最高压缩级别，适合长期存储
+    'small': {'page_compression': True, 'compress_level': 9},
+    # 不压缩，便于查看PDF内容或由下游统一压缩
+    'uncompressed': {'page_compression': False, 'compress_level': 0},
+}
+DEFAULT_OUTPUT_PROFILE = 'default'
+
+
+class ConversionOptions:
+    """
+    reportlab转换选项
+    streaming: 流式生成flowable并在排版后释放，默认开启（已生成的页面内容仍保留到保存PDF时）
+    lookahead: 流式模式下预先生成的flowable数量（keepWithNext等需要向后查看）
+    max_memory_mb: 进程内存上限（MB），流式排版时超出则抛出MemoryLimitExceeded，None表示不限制
+    profile_dir: 不为空时对每个文档做cProfile并将结果写入该目录
+    image_dpi: 图片缩小到的目标分辨率，0或None表示保留原图
+    render_workers: 大于1时，足够大的文档分段在多个进程中并行排版后合并（见parallel_render）
+    output_profile: 输出配置名称，见OUTPUT_PROFILES
+    invariant: 可复现输出，固定创建时间和文件ID，相同的输入和选项生成相同的字节
+    font_stats: 在转换记录中统计嵌入的字体子集数、字形数和字节数
+    """
+
+    # 会影响生成的PDF内容的选项，用于转换缓存键（分段排版时各段从新的一页开始）
+    OUTPUT_FIELDS = ('image_dpi', 'render_workers', 'output_profile', 'invariant')
+
+    def __init__(self, streaming=True, lookahead=64, max_memory_mb=None, profile_dir=None,
+                 image_dpi=DEFAULT_DPI, render_workers=0, output_profile=DEFAULT_OUTPUT_PROFILE,
+                 invariant=False, font_stats=False):
+        if output_profile not in OUTPUT_PROFILES:
+            raise ValueError(f"未知的输出配置: {output_profile}，可选: {', '.join(OUTPUT_PROFILES)}")
+        self.streaming = streaming
+        self.lookahead = lookahead
+        self.max_memory_mb = max_memory_mb
+        self.profile_dir = profile_dir
+        self.image_dpi = image_dpi
+        self.render_workers = render_workers
+        self.output_profile = output_profile
+        self.invariant = invariant
+        self.font_stats = font_stats
+
+    @property
+    def page_compression(self):
+        return OUTPUT_PROFILES[self.output_profile]['page_compression']
+
+    @property
+    def compress_level(self):
+        return OUTPUT_PROFILES[self.output_profile]['compress_level']
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    def output_settings(self):
+        return {name: getattr(self, name) for name in self.OUTPUT_FIELDS}
+
+
+def add_output_arguments(parser):
+    """命令行中的输出配置参数（批量转换、监视模式和转换服务共用）"""
+    group = parser.add_argument_group("输出")
+    group.add_argument('--output-profile', choices=list(OUTPUT_PROFILES), default=DEFAULT_OUTPUT_PROFILE,
+                       help="reportlab输出的压缩方式: fast压缩最快，small文件最小，uncompressed不压缩")
+    group.add_argument('--invariant', action='store_true',
+                       help="可复现输出: 固定创建时间和文件ID，相同输入生成相同的PDF")
+    group.add_argument('--font-stats', action='store_true',
+                       help="统计嵌入的字体子集、字形数和字节数（记录在转换结果的trace中）")
+    return group
+
+
+def output_arguments(args):
+    """add_output_arguments解析结果对应的ConversionOptions参数"""
+    return {
+        'output_profile': args.output_profile,
+        'invariant': args.invariant,
+        'font_stats': args.font_stats,
+    }
@@ -0,0 +1,430 @@
+"""
+本地转换服务
+
+长期运行的HTTP服务（监听TCP端口或Unix套接字），工作进程启动时就加载好字体和转换模块，
+每个请求不再承担Python、reportlab、python-docx的导入和字体解析开销。
+
+    POST /convert[?name=文件名.docx]   请求体为.docx文件内容，成功时返回PDF
+    GET  /health                      服务状态和统计（JSON）
+
+同时处理的请求数为工作进程数，超出的请求最多排队max_queue个，
+队列已满时立即返回503和Retry-After，由调用方稍后重试。
+工作进程在内存中生成PDF并随结果返回，不经过临时文件（--spool-output时写入临时文件）。
+
+    python conversion_service.py --port 8765 -w 4
+    curl --data-binary @a.docx -o a.pdf "http://127.0.0.1:8765/convert?name=a.docx"
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import socketserver
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, quote
+
+import font_registry
+from conversion_cache import ConversionCache, DEFAULT_MAX_BYTES
+from conversion_engine import BATCH_BACKENDS, CONVERTER_VERSION, convert_in_worker, preload_worker
+from conversion_options import ConversionOptions, add_output_arguments, output_arguments
+from conversion_errors import ServiceBusy
+from instrumentation import JsonLinesLogger
+
+DEFAULT_PORT = 8765
+# 上传文件大小上限 100MB
+DEFAULT_MAX_UPLOAD = 100 * 1024 * 1024
+# 默认单个文件超时秒数
+DEFAULT_TIMEOUT = 300
+
+_CHUNK_SIZE = 64 * 1024
+# .docx是zip文件
+_ZIP_MAGIC = b'PK\x03\x04'
+
+
+def _warm_up(delay):
+    """让进程池提前创建全部工作进程"""
+    time.sleep(delay)
+    return os.getpid()
+
+
+class ServiceStats:
+    """服务运行以来的统计，多个请求线程共用"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.accepted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.in_flight = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, **changes):
+        with self._lock:
+            for name, value in changes.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self):
+        with self._lock:
+            done = self.completed + self.failed
+            return {
+                'uptime': round(time.time() - self.started, 1),
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'completed': self.completed,
+                'failed': self.failed,
+                'timed_out': self.timed_out,
+                'in_flight': self.in_flight,
+                'avg_seconds': round(self.busy_seconds / done, 4) if done else 0.0,
+            }
+
+
+class ConversionService:
+    """
+    预热的工作进程池和有界请求队列
+    workers: 工作进程数（同时转换的文件数），默认为CPU核数
+    max_queue: 等待中的请求上限，默认为工作进程数的4倍
+    timeout: 单个文件超时秒数
+    in_memory: 工作进程在内存中生成PDF并随结果返回，不经过临时文件；为False时写入请求目录后再发送
+    """
+
+    def __init__(self, workers=None, max_queue=None, timeout=DEFAULT_TIMEOUT,
+                 backends=BATCH_BACKENDS, options=None, cache=None, work_dir=None,
+                 max_upload_bytes=DEFAULT_MAX_UPLOAD, log=None, in_memory=True):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = self.workers * 4 if max_queue is None else max_queue
+        self.timeout = timeout
+        self.backends = tuple(backends)
+        self.options = options
+        self.cache = cache
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix='word2pdf-service-')
+        self.max_upload_bytes = max_upload_bytes
+        self.log = log
+        self.in_memory = in_memory
+        self.stats = ServiceStats()
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def start(self):
+        """创建进程池，在工作进程中预先导入排版模块和加载字体，并等待所有进程就绪"""
+        # fork时子进程直接继承父进程中已导入的模块和已解析的字体
+        preload_worker(self.backends)
+        self._pool = self._create_pool()
+        return self
+
+    def _create_pool(self):
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=preload_worker,
+                                   initargs=(self.backends,))
+        warm = [pool.submit(_warm_up, 0.05) for _ in range(self.workers)]
+        for future in warm:
+            future.result()
+        return pool
+
+    def _replace_broken_pool(self, broken):
+        """工作进程异常退出（如被系统杀掉）后进程池不可再用，重新创建"""
+        with self._pool_lock:
+            if self._pool is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._create_pool()
+                self.emit('pool_restarted')
+
+    def emit(self, event, **fields):
+        if self.log:
+            self.log.emit(event, **fields)
+
+    def acquire(self):
+        """占用一个排队位置，队列已满时抛出ServiceBusy"""
+        if not self._slots.acquire(blocking=False):
+            self.stats.add(rejected=1)
+            raise ServiceBusy("转换队列已满，请稍后重试")
+        self.stats.add(accepted=1, in_flight=1)
+
+    def release(self):
+        self.stats.add(in_flight=-1)
+        self._slots.release()
+
+    def convert(self, docx_path, pdf_path):
+        """
+        在工作进程中转换，返回ConversionResult
+        调用前须先acquire()，无论成功与否都会释放排队位置
+        """
+        start = time.perf_counter()
+        try:
+            pool = self._pool
+            try:
+                result = pool.submit(convert_in_worker, docx_path, pdf_path, self.backends,
+                                     self.timeout, self.options, self.cache, self.in_memory).result()
+            except BrokenProcessPool:
+                self._replace_broken_pool(pool)
+                raise
+        finally:
+            self.stats.add(busy_seconds=time.perf_counter() - start)
+            self.release()
+        self.stats.add(completed=int(result.success), failed=int(not result.success),
+                       timed_out=int(result.timed_out))
+        return result
+
+    def health(self):
+        stats = self.stats.to_dict()
+        stats.update({
+            'version': CONVERTER_VERSION,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'queued': max(0, stats['in_flight'] - self.workers),
+            'backends': list(self.backends),
+            'fonts': font_registry.get_registry().report(),
+        })
+        return stats
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    """转换服务的HTTP请求处理，使用HTTP/1.1以便调用方复用连接"""
+    protocol_version = 'HTTP/1.1'
+    server_version = 'word2pdf/' + CONVERTER_VERSION
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def address_string(self):
+        # Unix套接字没有客户端地址
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        self.service.emit('http', client=self.address_string(), message=format % args)
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, headers=None):
+        self._send_json(status, {'error': message}, headers)
+
+    def do_GET(self):
+        if urlsplit(self.path).path == '/health':
+            self._send_json(200, self.service.health())
+        else:
+            self._send_error(404, "未知的路径")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/convert':
+            self.close_connection = True
+            self._send_error(404, "未知的路径")
+            return
+
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            self.close_connection = True
+            self._send_error(411, "请求须包含Content-Length")
+            return
+        length = int(length)
+        if length > self.service.max_upload_bytes:
+            self.close_connection = True
+            self._send_error(413, f"文件超过上限 {self.service.max_upload_bytes} 字节")
+            return
+
+        try:
+            self.service.acquire()
+        except ServiceBusy as e:
+            # 未读取请求体，不能继续复用这个连接
+            self.close_connection = True
+            self._send_error(503, str(e), {'Retry-After': '1'})
+            return
+
+        # 排队位置在转换结束后由service.convert释放，此前的失败在这里释放（先释放再响应），
+        # 意外的异常在finally中释放，每个请求只释放一次
+        owns_slot = True
+        request_dir = None
+        try:
+            query = url.query
+            try:
+                # 未编码的中文文件名被http.server按latin-1解码，还原为UTF-8
+                query = query.encode('latin-1').decode('utf-8')
+            except UnicodeError:
+                pass
+            name = parse_qs(query).get('name', ['document.docx'])[0]
+            try:
+                request_dir = tempfile.mkdtemp(dir=self.service.work_dir)
+            except OSError as e:
+                owns_slot = False
+                self.service.release()
+                # 未读取请求体，不能继续复用这个连接
+                self.close_connection = True
+                self._send_error(500, f"无法创建临时目录: {e}")
+                return
+            docx_path = os.path.join(request_dir, 'input.docx')
+            pdf_path = os.path.join(request_dir, 'output.pdf')
+            try:
+                self._receive(docx_path, length)
+            except OSError:
+                # 客户端断开或临时目录写入失败
+                self.close_connection = True
+                return
+            if not self._is_zip(docx_path):
+                owns_slot = False
+                self.service.release()
+                self._send_error(400, "请求体不是.docx文件")
+                return
+
+            owns_slot = False
+            result = self.service.convert(docx_path, pdf_path)
+            self.service.emit('conversion', name=name, **result.to_dict())
+            if result.timed_out:
+                self._send_error(504, result.error)
+            elif not result.success:
+                self._send_error(422, result.error or "转换失败")
+            else:
+                self._send_pdf(pdf_path, name, result)
+        except BrokenProcessPool:
+            self._send_error(500, "工作进程异常退出")
+        finally:
+            if owns_slot:
+                self.service.release()
+            if request_dir is not None:
+                shutil.rmtree(request_dir, ignore_errors=True)
+
+    def _receive(self, path, length):
+        """分块将请求体写入文件"""
+        remaining = length
+        with open(path, 'wb') as f:
+            while remaining > 0:
+                chunk = self.rfile.read(min(_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ConnectionError("请求体不完整")
+                f.write(chunk)
+                remaining -= len(chunk)
+
+    @staticmethod
+    def _is_zip(path):
+        with open(path, 'rb') as f:
+            return f.read(len(_ZIP_MAGIC)) == _ZIP_MAGIC
+
+    def _send_pdf(self, pdf_path, name, result):
+        """发送生成的PDF: 内存中的结果直接写出，文件分块发送"""
+        pdf_name = os.path.splitext(os.path.basename(name))[0] + '.pdf'
+        size = len(result.data) if result.data is not None else os.path.getsize(pdf_path)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(size))
+        self.send_header('Content-Disposition', f"attachment; filename*=UTF-8''{quote(pdf_name)}")
+        self.send_header('X-Conversion-Backend', result.backend or '')
+        self.send_header('X-Conversion-Seconds', f"{result.seconds:.4f}")
+        self.send_header('X-Conversion-Pages', str(result.pages or 0))
+        self.send_header('X-Conversion-Cache', 'hit' if result.cache_hit else 'miss')
+        self.end_headers()
+        if result.data is not None:
+            self.wfile.write(result.data)
+            return
+        with open(pdf_path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, _CHUNK_SIZE)
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    """监听Unix套接字的HTTP服务"""
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        # HTTPServer.server_bind会把地址当作(主机, 端口)解析
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def create_server(service, host='127.0.0.1', port=DEFAULT_PORT, unix_socket=None):
+    """创建绑定到service的HTTP服务，调用方负责serve_forever()"""
+    if unix_socket:
+        server = UnixHTTPServer(unix_socket, ConversionRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ConversionRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Word转PDF本地转换服务")
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址")
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument('--socket', help="监听Unix套接字路径（指定后忽略--host/--port）")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="工作进程数，默认为CPU核数")
+    parser.add_argument('--max-queue', type=int, default=None, help="排队请求上限，默认为工作进程数的4倍")
+    parser.add_argument('--max-upload', type=float, default=DEFAULT_MAX_UPLOAD / (1024 * 1024),
+                        help="上传文件大小上限(MB)")
+    parser.add_argument('-t', '--timeout', type=float, default=DEFAULT_TIMEOUT, help="单个文件超时秒数")
+    parser.add_argument('-b', '--backends', default=','.join(BATCH_BACKENDS),
+                        help="转换方法优先级，逗号分隔，可选: docx2pdf,wps,libreoffice,reportlab")
+    parser.add_argument('--cache-dir', default=None, help="转换缓存目录，默认为用户缓存目录下的word2pdf")
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="转换缓存上限(MB)")
+    parser.add_argument('--no-cache', action='store_true', help="不使用转换缓存")
+    parser.add_argument('--log', help="以JSON Lines格式记录请求和转换结果")
+    parser.add_argument('--spool-output', action='store_true',
+                        help="工作进程将PDF写入临时文件再发送（默认在内存中生成并直接返回）")
+    add_output_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.socket and not hasattr(socket, 'AF_UNIX'):
+        parser.error("当前系统不支持Unix套接字")
+    cache = None
+    if not args.no_cache:
+        cache = ConversionCache(args.cache_dir, int(args.cache_size * 1024 * 1024))
+    logger = JsonLinesLogger(args.log) if args.log else None
+
+    service = ConversionService(
+        workers=args.workers,
+        max_queue=args.max_queue,
+        timeout=args.timeout,
+        backends=[b.strip() for b in args.backends.split(',') if b.strip()],
+        options=ConversionOptions(**output_arguments(args)),
+        cache=cache,
+        max_upload_bytes=int(args.max_upload * 1024 * 1024),
+        log=logger,
+        in_memory=not args.spool_output,
+    ).start()
+    server = create_server(service, args.host, args.port, args.socket)
+
+    # SIGTERM时与Ctrl+C一样正常退出；shutdown()须在其他线程中调用
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    address = args.socket or f"http://{args.host}:{server.server_port}"
+    print(f"转换服务已启动: {address}  工作进程: {service.workers}  排队上限: {service.max_queue}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+        if logger:
+            logger.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
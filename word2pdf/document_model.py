@@ -0,0 +1,539 @@
+"""
+Word文档的中间模型
+
+只遍历一次文档，生成使用__slots__的紧凑记录，样式名和标题级别预先解析并按样式ID缓存。
+目录生成、段落渲染和表格处理都使用这个模型，不再反复访问doc.paragraphs
+（python-docx每次访问都会重建代理对象）。模型建好后即可释放python-docx文档。
+
+正文通过iter_body_blocks直接按XML顺序遍历w:p和w:tbl（包括内容控件w:sdt中的内容），
+段落和表格保持原文顺序。Word生成的目录（目录内容控件或TOC样式的段落）替换为TocBlock，
+在原位置按标题重建。
+run的格式（粗体、斜体、下划线、颜色、字号等）在遍历时一并读取为不可变的格式元组，
+相同格式共用同一个元组，渲染时可以直接作为缓存键。
+run中的图片（w:drawing，包括嵌入型和浮动型）记录为ImageRecord，
+图片数据引用python-docx已读入内存的图片部件，并按部件计算一次内容哈希。
+段落前分页（w:pageBreakBefore）、段落中的分页符和分节符记录在段落上，渲染时分页，
+也是大文档分段并行排版的切分位置。
+"""
+import re
+import hashlib
+
+from docx.enum.style import WD_STYLE_TYPE
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+
+# 文档中没有Word目录时，内容只有这些文字的段落视为目录标题，在该位置生成目录
+TOC_MARKERS = ('目录', 'Contents', '目 录')
+
+W_P = qn('w:p')
+W_TBL = qn('w:tbl')
+W_TR = qn('w:tr')
+W_TC = qn('w:tc')
+W_R = qn('w:r')
+W_T = qn('w:t')
+W_TAB = qn('w:tab')
+W_BR = qn('w:br')
+W_CR = qn('w:cr')
+W_TYPE = qn('w:type')
+W_PPR = qn('w:pPr')
+W_PAGEBREAKBEFORE = qn('w:pageBreakBefore')
+W_SECTPR = qn('w:sectPr')
+W_HYPERLINK = qn('w:hyperlink')
+W_RPR = qn('w:rPr')
+W_VAL = qn('w:val')
+R_ID = qn('r:id')
+W_SDT = qn('w:sdt')
+W_SDTPR = qn('w:sdtPr')
+W_SDTCONTENT = qn('w:sdtContent')
+W_DOCPARTGALLERY = qn('w:docPartGallery')
+W_DRAWING = qn('w:drawing')
+A_BLIP = qn('a:blip')
+R_EMBED = qn('r:embed')
+WP_EXTENT = qn('wp:extent')
+
+# 1磅 = 12700 EMU
+EMU_PER_POINT = 12700
+
+# rPr中开关类属性的关闭值
+_OFF_VALUES = ('0', 'false', 'off', 'none')
+
+# rPr子元素 -> 格式元组中的位置
+_B, _I, _U, _STRIKE, _COLOR, _SIZE, _FONT, _VERT = range(8)
+_TOGGLE_TAGS = {
+    qn('w:b'): _B,
+    qn('w:i'): _I,
+    qn('w:u'): _U,
+    qn('w:strike'): _STRIKE,
+    qn('w:dstrike'): _STRIKE,
+}
+W_COLOR = qn('w:color')
+W_SZ = qn('w:sz')
+W_RFONTS = qn('w:rFonts')
+W_VERTALIGN = qn('w:vertAlign')
+W_TRPR = qn('w:trPr')
+W_TBLHEADER = qn('w:tblHeader')
+W_GRIDBEFORE = qn('w:gridBefore')
+W_TBLGRID = qn('w:tblGrid')
+W_GRIDCOL = qn('w:gridCol')
+W_W = qn('w:w')
+_FONT_ATTRS = (qn('w:eastAsia'), qn('w:ascii'), qn('w:hAnsi'))
+
+_LEVEL_PATTERN = re.compile(r'\d+')
+
+
+class RunFormat(tuple):
+    """
+    run的格式: (粗体, 斜体, 下划线, 删除线, 颜色'#RRGGBB', 字号(磅), 字体名, 上下标)
+    未设置的项为False/None
+    """
+    __slots__ = ()
+
+    bold = property(lambda self: self[_B])
+    italic = property(lambda self: self[_I])
+    underline = property(lambda self: self[_U])
+    strike = property(lambda self: self[_STRIKE])
+    color = property(lambda self: self[_COLOR])
+    size = property(lambda self: self[_SIZE])
+    font = property(lambda self: self[_FONT])
+    vert_align = property(lambda self: self[_VERT])
+
+
+# 无任何格式
+PLAIN = RunFormat((False, False, False, False, None, None, None, None))
+
+
+class RunRecord:
+    """
+    段落中的一个run
+    fmt: RunFormat
+    link: 所在超链接的目标地址，不在超链接中为None
+    """
+    __slots__ = ('text', 'fmt', 'link')
+
+    def __init__(self, text, fmt=PLAIN, link=None):
+        self.text = text
+        self.fmt = fmt
+        self.link = link
+
+
+class ImageRecord:
+    """
+    段落中的一张图片
+    digest: 图片内容的SHA-1，用于去重
+    blob: 图片文件数据（与图片部件共用，不复制）
+    width/height: 文档中的显示尺寸（磅），缺失时为None
+    """
+    __slots__ = ('digest', 'blob', 'width', 'height')
+
+    def __init__(self, digest, blob, width=None, height=None):
+        self.digest = digest
+        self.blob = blob
+        self.width = width
+        self.height = height
+
+
+class ParagraphBlock:
+    """
+    段落记录
+    style_name: 样式名
+    is_heading: 样式名以Heading开头
+    heading_level: 标题级别，非标题或无级别时为None
+    toc_marker: 段落内容只有目录标题文字（如“目录”）
+    images: 段落中的ImageRecord，按出现顺序
+    break_before: 段落从新的一页开始（w:pageBreakBefore）
+    break_after: 段落后分页（段落中有分页符，或段落结束一个非连续的节）
+    """
+    __slots__ = ('style_name', 'is_heading', 'heading_level', 'text', 'runs', 'toc_marker',
+                 'images', 'break_before', 'break_after')
+    kind = 'paragraph'
+
+    def __init__(self, style_name, is_heading, heading_level, text, runs, toc_marker, images=(),
+                 break_before=False, break_after=False):
+        self.style_name = style_name
+        self.is_heading = is_heading
+        self.heading_level = heading_level
+        self.text = text
+        self.runs = runs
+        self.toc_marker = toc_marker
+        self.images = images
+        self.break_before = break_before
+        self.break_after = break_after
+
+
+class TableBlock:
+    """
+    表格记录
+    rows: 按网格展开的单元格文本二维列表，各行列数相同，被合并覆盖的位置为空字符串
+    spans: 合并单元格[(起始列, 起始行, 结束列, 结束行)]，与reportlab的SPAN坐标一致
+    header_rows: 标记为标题行(w:tblHeader)的前几行数量，跨页时重复
+    col_widths: w:tblGrid中的列宽（磅），缺失时为None
+    """
+    __slots__ = ('rows', 'spans', 'header_rows', 'col_widths')
+    kind = 'table'
+
+    def __init__(self, rows, spans=(), header_rows=0, col_widths=None):
+        self.rows = rows
+        self.spans = spans
+        self.header_rows = header_rows
+        self.col_widths = col_widths
+
+
+class TocBlock:
+    """目录的位置，渲染时按文档中的标题重建"""
+    __slots__ = ()
+    kind = 'toc'
+
+
+class DocumentModel:
+    """
+    整个文档的模型
+    blocks: ParagraphBlock/TableBlock/TocBlock列表
+    headings: [(级别, 文本)]，所有有级别且有文字的标题，按文档顺序，用于目录和书签
+    has_toc: 文档中是否有目录
+    """
+    __slots__ = ('blocks', 'headings', 'has_toc', 'paragraph_count', 'table_count')
+
+    def __init__(self):
+        self.blocks = []
+        self.headings = []
+        self.has_toc = False
+        self.paragraph_count = 0
+        self.table_count = 0
+
+
+class StyleResolver:
+    """
+    按样式ID缓存样式名和标题级别，避免每个段落都查找样式表
+    """
+
+    def __init__(self, document):
+        self._part = document.part
+        self._cache = {}
+        # 超链接关系ID -> 目标地址
+        self.links = {
+            rId: rel.target_ref
+            for rId, rel in self._part.rels.items()
+            if rel.reltype == RT.HYPERLINK
+        }
+        # 相同格式共用一个RunFormat
+        self._formats = {PLAIN: PLAIN}
+        # 图片关系ID -> (内容哈希, 数据)
+        self._images = {}
+
+    def resolve(self, style_id):
+        """返回(样式名, 是否标题, 标题级别)"""
+        cached = self._cache.get(style_id)
+        if cached is None:
+            name = self._part.get_style(style_id, WD_STYLE_TYPE.PARAGRAPH).name
+            is_heading = name.startswith('Heading')
+            level = None
+            if is_heading:
+                level_match = _LEVEL_PATTERN.search(name)
+                if level_match:
+                    level = int(level_match.group())
+            cached = (name, is_heading, level)
+            self._cache[style_id] = cached
+        return cached
+
+    def intern_format(self, values):
+        fmt = RunFormat(values)
+        return self._formats.setdefault(fmt, fmt)
+
+    def image(self, rId):
+        """返回(内容哈希, 图片数据)，关系不存在或是外部链接的图片时返回None"""
+        if rId not in self._images:
+            part = self._part.related_parts.get(rId) if rId else None
+            blob = getattr(part, 'blob', None)
+            self._images[rId] = (hashlib.sha1(blob).hexdigest(), blob) if blob else None
+        return self._images[rId]
+
+
+def run_format(r, styles):
+    """读取run的直接格式，返回RunFormat"""
+    rPr = r.find(W_RPR)
+    if rPr is None:
+        return PLAIN
+
+    values = [False, False, False, False, None, None, None, None]
+    for child in rPr.iterchildren():
+        tag = child.tag
+        index = _TOGGLE_TAGS.get(tag)
+        if index is not None:
+            values[index] = child.get(W_VAL) not in _OFF_VALUES
+        elif tag == W_COLOR:
+            color = child.get(W_VAL)
+            if color and color != 'auto':
+                values[_COLOR] = '#' + color
+        elif tag == W_SZ:
+            size = child.get(W_VAL)
+            if size and size.isdigit():
+                values[_SIZE] = int(size) / 2
+        elif tag == W_RFONTS:
+            for attr in _FONT_ATTRS:
+                font = child.get(attr)
+                if font:
+                    values[_FONT] = font
+                    break
+        elif tag == W_VERTALIGN:
+            vert = child.get(W_VAL)
+            if vert in ('superscript', 'subscript'):
+                values[_VERT] = vert
+    return styles.intern_format(tuple(values))
+
+
+def run_text(r, drawings=None):
+    """
+    run的文本，w:tab转换为制表符，w:br/w:cr转换为换行
+    drawings不为None时收集run中的w:drawing元素
+    """
+    parts = []
+    for child in r.iterchildren():
+        tag = child.tag
+        if tag == W_T:
+            if child.text:
+                parts.append(child.text)
+        elif tag == W_TAB:
+            parts.append('\t')
+        elif tag == W_BR or tag == W_CR:
+            parts.append('\n')
+        elif tag == W_DRAWING and drawings is not None:
+            drawings.append(child)
+    return ''.join(parts)
+
+
+def drawing_image(drawing, styles):
+    """由w:drawing元素生成ImageRecord，没有可用的图片数据时返回None"""
+    blip = next(drawing.iter(A_BLIP), None)
+    if blip is None:
+        return None
+    image = styles.image(blip.get(R_EMBED))
+    if image is None:
+        return None
+    width = height = None
+    extent = next(drawing.iter(WP_EXTENT), None)
+    if extent is not None:
+        cx, cy = extent.get('cx', ''), extent.get('cy', '')
+        if cx.isdigit() and cy.isdigit() and int(cx) and int(cy):
+            width, height = int(cx) / EMU_PER_POINT, int(cy) / EMU_PER_POINT
+    return ImageRecord(image[0], image[1], width, height)
+
+
+def _page_breaks(p):
+    """返回段落的(段前分页, 段后分页)"""
+    before = after = False
+    pPr = p.find(W_PPR)
+    if pPr is not None:
+        before = _on(pPr.find(W_PAGEBREAKBEFORE))
+        sectPr = pPr.find(W_SECTPR)
+        if sectPr is not None:
+            section_type = sectPr.find(W_TYPE)
+            after = section_type is None or section_type.get(W_VAL) != 'continuous'
+    if not after:
+        after = any(br.get(W_TYPE) == 'page' for br in p.iter(W_BR))
+    return before, after
+
+
+def paragraph_block(p, styles):
+    """由w:p元素生成ParagraphBlock"""
+    style_name, is_heading, level = styles.resolve(p.style)
+    runs = []
+    drawings = []
+    for child in p.iterchildren(W_R, W_HYPERLINK):
+        if child.tag == W_R:
+            runs.append(RunRecord(run_text(child, drawings), run_format(child, styles)))
+            continue
+        # 超链接中的run，外部链接通过关系ID查找地址（文档内书签链接只保留文本）
+        link = styles.links.get(child.get(R_ID))
+        for r in child.iterchildren(W_R):
+            runs.append(RunRecord(run_text(r, drawings), run_format(r, styles), link))
+    text = ''.join(run.text for run in runs)
+    toc_marker = text.strip() in TOC_MARKERS
+    images = ()
+    if drawings:
+        images = [image for image in (drawing_image(d, styles) for d in drawings) if image]
+    before, after = _page_breaks(p)
+    return ParagraphBlock(style_name, is_heading, level, text, runs, toc_marker, images, before, after)
+
+
+def _cell_text(tc):
+    return '\n'.join(
+        ''.join(run_text(r) for r in p.iterchildren(W_R))
+        for p in tc.iterchildren(W_P)
+    ).strip()
+
+
+def _on(element):
+    return element is not None and element.get(W_VAL) not in _OFF_VALUES
+
+
+def _grid_widths(tbl):
+    """w:tblGrid中的列宽（twips转换为磅）"""
+    grid = tbl.find(W_TBLGRID)
+    if grid is None:
+        return None
+    widths = []
+    for col in grid.iterchildren(W_GRIDCOL):
+        width = col.get(W_W)
+        if not width or not width.isdigit():
+            return None
+        widths.append(int(width) / 20)
+    return widths or None
+
+
+def table_block(tbl):
+    """
+    由w:tbl元素一次遍历生成TableBlock
+    横向合并(gridSpan)和纵向合并(vMerge)的单元格转换为spans，文本只保留在合并区域的左上角
+    """
+    rows = []
+    # 合并起点(列, 行) -> [结束列, 结束行]
+    spans = {}
+    # 列 -> 上一行该列所属合并区域的起点，用于延续vMerge
+    column_origin = {}
+    header_rows = 0
+    counting_header = True
+
+    for row_index, tr in enumerate(tbl.iterchildren(W_TR)):
+        row = []
+        trPr = tr.find(W_TRPR)
+        if trPr is not None:
+            before = trPr.find(W_GRIDBEFORE)
+            if before is not None and (before.get(W_VAL) or '').isdigit():
+                row.extend([''] * int(before.get(W_VAL)))
+        if counting_header and trPr is not None and _on(trPr.find(W_TBLHEADER)):
+            header_rows += 1
+        else:
+            counting_header = False
+
+        # 本行各列所属合并区域的起点
+        row_origin = {}
+        for tc in tr.iterchildren(W_TC):
+            col = len(row)
+            span = tc.grid_span
+            origin = column_origin.get(col)
+            if tc.vMerge == 'continue' and origin is not None:
+                # 向下延伸上方的合并区域
+                spans[origin][1] = row_index
+                row.extend([''] * span)
+            else:
+                row.append(_cell_text(tc))
+                row.extend([''] * (span - 1))
+                origin = (col, row_index)
+                spans[origin] = [col + span - 1, row_index]
+            for c in range(col, col + span):
+                row_origin[c] = origin
+        column_origin = row_origin
+        rows.append(row)
+
+    # 补齐各行列数
+    width = max((len(row) for row in rows), default=0)
+    for row in rows:
+        if len(row) < width:
+            row.extend([''] * (width - len(row)))
+
+    span_list = [
+        (col0, row0, col1, row1)
+        for (col0, row0), (col1, row1) in spans.items()
+        if col1 > col0 or row1 > row0
+    ]
+    col_widths = _grid_widths(tbl)
+    if col_widths and len(col_widths) != width:
+        col_widths = None
+    return TableBlock(rows, span_list, header_rows, col_widths)
+
+
+def _is_toc_sdt(sdt):
+    """Word插入的目录内容控件（docPartGallery为Table of Contents）"""
+    sdtPr = sdt.find(W_SDTPR)
+    if sdtPr is None:
+        return False
+    gallery = next(sdtPr.iter(W_DOCPARTGALLERY), None)
+    return gallery is not None and (gallery.get(W_VAL) or '').startswith('Table of Contents')
+
+
+def _is_toc_style(style_name):
+    """Word目录项（TOC 1~9）和目录标题（TOC Heading）的样式"""
+    return style_name.lower().startswith('toc')
+
+
+def _iter_blocks(parent, styles):
+    in_toc = False
+    for element in parent.iterchildren(W_P, W_TBL, W_SDT):
+        tag = element.tag
+        if tag == W_SDT:
+            if _is_toc_sdt(element):
+                yield TocBlock()
+                in_toc = False
+                continue
+            content = element.find(W_SDTCONTENT)
+            if content is not None:
+                yield from _iter_blocks(content, styles)
+            continue
+        if tag == W_TBL:
+            in_toc = False
+            yield table_block(element)
+            continue
+
+        block = paragraph_block(element, styles)
+        if _is_toc_style(block.style_name):
+            # 不在内容控件中的目录域: 连续的目录项段落替换为一个TocBlock
+            if not in_toc:
+                in_toc = True
+                yield TocBlock()
+            continue
+        in_toc = False
+        yield block
+
+
+def iter_body_blocks(document, styles=None):
+    """
+    按文档顺序产生正文中的ParagraphBlock、TableBlock和TocBlock
+    直接遍历body下的w:p/w:tbl/w:sdt元素，不创建python-docx代理对象
+    """
+    styles = styles or StyleResolver(document)
+    yield from _iter_blocks(document.element.body, styles)
+
+
+def build_document_model(document):
+    """
+    一次遍历生成DocumentModel，段落、表格和目录保持文档中的顺序
+    """
+    model = DocumentModel()
+    blocks = model.blocks
+    first_marker = None
+
+    for block in iter_body_blocks(document):
+        kind = block.kind
+        if kind == 'toc':
+            # 紧挨在目录前的“目录”标题由重建的目录代替
+            if blocks and blocks[-1].kind == 'paragraph' and blocks[-1].toc_marker:
+                marker = blocks.pop()
+                model.paragraph_count -= 1
+                # 作为标题时也不再出现在目录和书签中，否则之后的标题序号与书签名错位
+                if marker.heading_level is not None:
+                    model.headings.pop()
+                if first_marker == len(blocks):
+                    first_marker = None
+            model.has_toc = True
+            blocks.append(block)
+            continue
+        blocks.append(block)
+        if kind == 'table':
+            model.table_count += 1
+            continue
+        model.paragraph_count += 1
+        if block.heading_level is not None and block.text.strip():
+            model.headings.append((block.heading_level, block.text))
+        if block.toc_marker and first_marker is None:
+            first_marker = len(blocks) - 1
+
+    # 没有Word目录时，在第一个“目录”标题处生成目录
+    if not model.has_toc and first_marker is not None:
+        marker = blocks[first_marker]
+        if marker.heading_level is not None:
+            model.headings.remove((marker.heading_level, marker.text))
+        blocks[first_marker] = TocBlock()
+        model.paragraph_count -= 1
+        model.has_toc = True
+
+    return model
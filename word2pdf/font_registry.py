@@ -0,0 +1,233 @@
+"""
+进程级中文字体注册表
+
+每个进程只查找并解析一次中文字体（TTC解析宋体是冷启动中最耗时的步骤之一），
+解析后的TTFont对象缓存在模块中:
+- 进程池使用fork时，在创建进程池前调用preload()，子进程直接继承已解析的字体
+- 使用spawn时，将preload作为进程池的initializer，每个工作进程只加载一次
+未找到中文字体时回退到Helvetica（中文会显示为方框），通过report()中的fallback和warnings报告
+reportlab在加载字体时才导入，只导入本模块不会加载reportlab
+"""
+import os
+import sys
+import time
+import shutil
+import threading
+
+# 回退字体（不支持中文）
+FALLBACK_BODY_FONT = 'Helvetica'
+FALLBACK_HEADING_FONT = 'Helvetica-Bold'
+
+# 正文字体候选: (注册名, 路径, TTC子字体序号)，按优先级排列
+# reportlab只支持TrueType(glyf)轮廓，Noto CJK/思源等CFF轮廓的字体无法加载，不列入候选
+BODY_FONT_CANDIDATES = [
+    ('SimSun', "C:\\Windows\\Fonts\\simsun.ttc", 0),  # 宋体
+    ('SimSun', "C:\\WINNT\\Fonts\\simsun.ttc", 0),
+    ('SimSun', "/usr/share/fonts/truetype/windows/simsun.ttc", 0),
+    ('WenQuanYiZenHei', "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc", 0),
+    ('WenQuanYiZenHei', "/usr/share/fonts/wqy-zenhei/wqy-zenhei.ttc", 0),
+    ('WenQuanYiMicroHei', "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc", 0),
+    ('WenQuanYiMicroHei', "/usr/share/fonts/wqy-microhei/wqy-microhei.ttc", 0),
+    ('DroidSansFallback', "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf", 0),
+    ('DroidSansFallback', "/usr/share/fonts/google-droid-sans-fonts/DroidSansFallbackFull.ttf", 0),
+]
+
+# 标题字体候选
+HEADING_FONT_CANDIDATES = [
+    ('SimHei', "C:\\Windows\\Fonts\\simhei.ttf", 0),  # 黑体
+    ('SimHei', "C:\\WINNT\\Fonts\\simhei.ttf", 0),
+    ('SimHei', "/usr/share/fonts/truetype/windows/simhei.ttf", 0),
+]
+
+# fontconfig结果中只取TrueType轮廓的字体（.otf/.ttc也可能是CFF轮廓，扩展名不足以判断）
+TRUETYPE_EXTENSIONS = ('.ttf', '.ttc')
+TRUETYPE_FORMAT = 'TrueType'
+
+
+def _fontconfig_candidates():
+    """
+    通过fontconfig查找支持中文的字体文件（仅Linux等安装了fc-list的系统）
+    """
+    if sys.platform.startswith('win') or not shutil.which('fc-list'):
+        return []
+    import subprocess
+
+    try:
+        output = subprocess.run(
+            ['fc-list', ':lang=zh', '-f', '%{file}\t%{fontformat}\t%{index}\n'],
+            capture_output=True, text=True, timeout=10
+        ).stdout
+    except Exception:
+        return []
+
+    candidates = []
+    for line in sorted(output.splitlines()):
+        parts = line.split('\t')
+        if len(parts) != 3:
+            continue
+        path, font_format, index = parts
+        if font_format != TRUETYPE_FORMAT or not path.lower().endswith(TRUETYPE_EXTENSIONS):
+            continue
+        index = int(index) if index.isdigit() else 0
+        name = os.path.splitext(os.path.basename(path))[0].replace('-', '').replace('_', '')
+        candidates.append((f'{name}{index}' if index else name, path, index))
+    return candidates
+
+
+class FontRegistry:
+    """
+    查找、解析并注册中文字体，结果在进程内复用
+    """
+
+    def __init__(self, body_candidates=None, heading_candidates=None):
+        self.body_candidates = list(body_candidates or BODY_FONT_CANDIDATES)
+        self.heading_candidates = list(heading_candidates or HEADING_FONT_CANDIDATES)
+        self.body_font = FALLBACK_BODY_FONT
+        self.heading_font = FALLBACK_HEADING_FONT
+        self.fonts = {}       # 注册名 -> TTFont
+        self.paths = {}       # 注册名 -> 字体文件路径
+        self.timings = {}     # 步骤/字体 -> 秒
+        self.warnings = []
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def cjk(self):
+        """是否注册了中文字体"""
+        return self.body_font != FALLBACK_BODY_FONT
+
+    @property
+    def fallback(self):
+        return not self.cjk
+
+    def _load(self, name, path, subfont_index):
+        """解析并注册一个字体，同名字体只解析一次；失败返回None"""
+        if name in self.fonts:
+            return name
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        start = time.perf_counter()
+        try:
+            font = TTFont(name, path, subfontIndex=subfont_index)
+            pdfmetrics.registerFont(font)
+        except Exception as e:
+            self.warnings.append(f"字体加载失败 {path}: {e}")
+            return None
+        self.timings[name] = time.perf_counter() - start
+        self.fonts[name] = font
+        self.paths[name] = path
+        return name
+
+    def _first_available(self, candidates):
+        for name, path, subfont_index in candidates:
+            if os.path.exists(path):
+                loaded = self._load(name, path, subfont_index)
+                if loaded:
+                    return loaded
+        return None
+
+    def load(self):
+        """
+        查找并注册字体，重复调用直接返回
+        """
+        if self.loaded:
+            return self
+        with self._lock:
+            if self.loaded:
+                return self
+
+            start = time.perf_counter()
+            body = self._first_available(self.body_candidates)
+            heading = self._first_available(self.heading_candidates)
+            if body is None and heading is None:
+                # 常见路径都不存在时再询问fontconfig
+                discover_start = time.perf_counter()
+                extra = _fontconfig_candidates()
+                self.timings['fontconfig'] = time.perf_counter() - discover_start
+                body = self._first_available(extra)
+
+            # 只找到一种字体时正文和标题共用
+            body = body or heading
+            heading = heading or body
+            if body:
+                self.body_font = body
+                self.heading_font = heading
+                self._register_families()
+            else:
+                message = ("未找到可用的中文字体（需要TrueType轮廓的字体，如宋体、文泉驿正黑/微米黑、"
+                           "DroidSansFallback），回退到Helvetica，中文将显示为方框")
+                self.warnings.append(message)
+                # 每个进程只加载一次，警告也只输出一次
+                print(f"警告: {message}", file=sys.stderr)
+
+            self.timings['total'] = time.perf_counter() - start
+            self.loaded = True
+        return self
+
+    def _register_families(self):
+        """
+        中文字体没有粗体/斜体变体，<b>映射到标题字体（黑体），斜体沿用原字体
+        """
+        from reportlab.lib.fonts import addMapping
+
+        for name, bold in ((self.body_font, self.heading_font), (self.heading_font, self.heading_font)):
+            addMapping(name, 0, 0, name)
+            addMapping(name, 0, 1, name)
+            addMapping(name, 1, 0, bold)
+            addMapping(name, 1, 1, bold)
+
+    def report(self):
+        """字体注册情况和耗时"""
+        return {
+            'body_font': self.body_font,
+            'heading_font': self.heading_font,
+            'cjk': self.cjk,
+            'fallback': self.fallback,
+            'paths': dict(self.paths),
+            'timings': {k: round(v, 4) for k, v in self.timings.items()},
+            'warnings': list(self.warnings),
+        }
+
+
+_registry = FontRegistry()
+
+
+def get_registry():
+    """返回已加载的进程级字体注册表"""
+    return _registry.load()
+
+
+def preload():
+    """
+    预加载字体，可作为进程池的initializer，
+    或在fork之前于父进程中调用
+    """
+    get_registry()
+
+
+def fingerprint():
+    """
+    标识当前使用的字体文件（路径、大小、修改时间），用于转换缓存键
+    先加载字体（每个进程只加载一次）：只检查候选路径时找不到fontconfig给出的字体，
+    也无法得知候选字体能否解析，加载前后的缓存键会不同
+    """
+    registry = get_registry()
+    paths = [registry.paths.get(registry.body_font), registry.paths.get(registry.heading_font)]
+
+    result = []
+    for path in paths:
+        if path and os.path.exists(path):
+            st = os.stat(path)
+            result.append([path, st.st_size, int(st.st_mtime)])
+        else:
+            result.append(None)
+    return result
+
+
+def register_chinese_fonts():
+    """
+    尝试注册中文字体以支持中文显示
+    返回True表示字体注册成功，False表示失败
+    """
+    return get_registry().cjk
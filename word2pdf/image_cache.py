@@ -0,0 +1,139 @@
+"""
+嵌入图片的解码和缩放缓存
+
+图片数据直接取自python-docx已读入内存的图片部件，不解压到磁盘。
+大于目标分辨率的图片按显示尺寸缩小到目标DPI（JPEG利用解码器的draft模式直接按比例解码），
+结果按内容哈希缓存为ImageReader:
+- 同一图片在文档中重复出现（如每页的logo）只解码和缩放一次
+- reportlab按图片数据识别相同的图片，PDF中也只嵌入一次
+缓存在进程内共用，批量转换时不同文档中的相同图片也可以复用；总大小超过上限时淘汰最久未使用的图片。
+"""
+import io
+import threading
+from collections import OrderedDict
+
+from PIL import Image as PILImage
+from reportlab.lib.utils import ImageReader
+
+from conversion_options import DEFAULT_DPI
+# 缓存上限（按解码后的像素数据估算）64MB
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# 原图不超过目标像素的该倍数时不缩放，避免为了很小的收益重新编码
+RESAMPLE_MARGIN = 1.25
+# 可以直接嵌入PDF的格式
+_PASSTHROUGH_FORMATS = ('JPEG', 'PNG')
+JPEG_QUALITY = 85
+
+
+def prepare_image(blob, width_pt, height_pt, dpi=DEFAULT_DPI):
+    """
+    将图片缩小到显示尺寸下的目标DPI
+    width_pt/height_pt: 显示尺寸（磅），为None时不缩放
+    返回(图片数据, 像素宽, 像素高)，无法解码（如EMF/WMF/SVG）时返回None
+    """
+    try:
+        image = PILImage.open(io.BytesIO(blob))
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+    with image:
+        source_format = image.format
+        width, height = image.size
+        if width_pt and height_pt and dpi:
+            target = (max(1, round(width_pt / 72 * dpi)), max(1, round(height_pt / 72 * dpi)))
+        else:
+            target = image.size
+        needs_resample = width > target[0] * RESAMPLE_MARGIN or height > target[1] * RESAMPLE_MARGIN
+        if not needs_resample and source_format in _PASSTHROUGH_FORMATS:
+            return blob, width, height
+
+        try:
+            if needs_resample and source_format == 'JPEG':
+                # JPEG可在解码时直接按1/2、1/4、1/8缩小
+                image.draft(image.mode, target)
+            image = _normalize_mode(image, needs_resample)
+            if needs_resample:
+                image.thumbnail(target, PILImage.LANCZOS)
+            return _encode(image, source_format)
+        except (OSError, ValueError):
+            return None
+
+
+def _normalize_mode(image, resample):
+    """转换为PDF可以直接使用的颜色模式；黑白图缩小前转为灰度，否则只能按最近邻缩放"""
+    mode = image.mode
+    if mode in ('P', 'PA'):
+        return image.convert('RGBA' if mode == 'PA' or 'transparency' in image.info else 'RGB')
+    if mode == '1' and resample:
+        return image.convert('L')
+    if mode in ('RGB', 'RGBA', 'L', 'LA', '1'):
+        image.load()
+        return image
+    return image.convert('RGB')
+
+
+def _encode(image, source_format):
+    """照片类（原为JPEG）编码为JPEG，其他（扫描件、线条图、带透明度）编码为PNG"""
+    out = io.BytesIO()
+    if source_format == 'JPEG' and image.mode in ('RGB', 'L'):
+        image.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+    else:
+        image.save(out, 'PNG', optimize=False)
+    return out.getvalue(), image.size[0], image.size[1]
+
+
+class ImageCache:
+    """
+    内容哈希 -> 缩放后的ImageReader
+    键包含目标像素尺寸，同一图片以不同大小显示时分别缓存
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, digest, blob, width_pt, height_pt, dpi=DEFAULT_DPI):
+        """
+        返回(ImageReader, 像素宽, 像素高)，无法解码时返回None
+        """
+        key = (digest, round(width_pt or 0, 1), round(height_pt or 0, 1), dpi)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        prepared = prepare_image(blob, width_pt, height_pt, dpi)
+        value = None
+        if prepared is not None:
+            data, width, height = prepared
+            value = (ImageReader(io.BytesIO(data)), width, height)
+        # 解码后的像素数据在reportlab首次使用时生成，按RGBA估算
+        size = len(data) + width * height * 4 if prepared is not None else 0
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_cache = ImageCache()
+
+
+def get_image_cache():
+    """进程内共用的图片缓存"""
+    return _cache
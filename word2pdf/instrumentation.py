@@ -0,0 +1,116 @@
+"""
+转换过程的计时与日志
+
+ConversionTrace记录各阶段耗时（span）和计数（counter），随转换结果一起返回；
+JsonLinesLogger以JSON Lines格式写入带缓冲的日志文件，文件只打开一次，
+代替每条消息都重新打开文件追加的调试日志。
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+
+
+class ConversionTrace:
+    """
+    单个文件转换的阶段耗时和计数
+    同名span多次进入时耗时累加
+    """
+
+    def __init__(self):
+        self.spans = {}
+        self.counters = {}
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        return {
+            'spans': {name: round(seconds, 6) for name, seconds in self.spans.items()},
+            'counters': dict(self.counters),
+        }
+
+
+class JsonLinesLogger:
+    """
+    带缓冲的JSON Lines日志
+    每行一个事件: {"ts": 时间戳, "event": 事件名, ...}
+    可直接作为转换引擎的log回调使用
+    mode: 'a'追加到已有日志，'w'清空后重新写入
+    """
+
+    def __init__(self, path, buffer_size=64 * 1024, echo=False, mode='a'):
+        self.path = path
+        self.echo = echo
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, mode, encoding='utf-8', buffering=buffer_size)
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        record = {'ts': round(time.time(), 3), 'event': event}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+        if self.echo:
+            print(line)
+
+    def __call__(self, message):
+        self.emit('log', message=message)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def profile_path(profile_dir, source):
+    """
+    cProfile输出文件路径: <文件名>-<完整路径的短哈希>.prof，避免不同目录的同名文件互相覆盖
+    """
+    digest = hashlib.sha1(os.path.abspath(source).encode('utf-8')).hexdigest()[:8]
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(profile_dir, f"{name}-{digest}.prof")
+
+
+@contextmanager
+def maybe_profile(profile_dir, source):
+    """profile_dir不为空时对代码块做cProfile，并将结果写入profile_path()"""
+    if not profile_dir:
+        yield None
+        return
+    import cProfile
+
+    os.makedirs(profile_dir, exist_ok=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_path(profile_dir, source))
@@ -0,0 +1,403 @@
+"""
+LibreOffice无界面转换（soffice --headless）
+
+每个进程维护一个LibreOffice实例池，实例在多次转换之间复用，不再每个文件启动一次soffice:
+- 能导入uno模块时（LibreOffice自带的Python或python3-uno），实例是常驻的soffice进程，
+  通过UNO管道连接加载文档并导出PDF
+- 否则每次转换调用soffice --convert-to，但每个实例使用固定的用户配置目录，
+  省去首次启动时创建配置的开销
+每个实例有独立的用户配置目录（LibreOffice同一配置目录只能被一个进程使用），
+转换前检查实例是否存活，超时或出错的实例会被杀掉并在下次使用时重启，
+转换一定次数后也会重启以限制内存增长。
+
+配置通过环境变量传递，进程池的子进程（fork或spawn）都能继承:
+    WORD2PDF_SOFFICE        soffice可执行文件路径，默认自动查找
+    WORD2PDF_LO_INSTANCES   每个进程的实例数，默认1
+    WORD2PDF_LO_TIMEOUT     单个文件超时秒数，默认120
+"""
+import os
+import glob
+import importlib.util
+import time
+import queue
+import shutil
+import signal
+import tempfile
+import threading
+import subprocess
+
+from conversion_errors import ConversionError, ConversionTimeout
+
+DEFAULT_INSTANCES = 1
+DEFAULT_TIMEOUT = 120
+# 实例转换该数量的文件后重启
+MAX_JOBS_PER_INSTANCE = 200
+# 常驻实例启动并接受UNO连接的最长等待时间
+STARTUP_TIMEOUT = 60
+
+SOFFICE_CANDIDATES = [
+    "C:\\Program Files\\LibreOffice\\program\\soffice.exe",
+    "C:\\Program Files (x86)\\LibreOffice\\program\\soffice.exe",
+    "/Applications/LibreOffice.app/Contents/MacOS/soffice",
+    "/usr/lib/libreoffice/program/soffice",
+    "/usr/lib64/libreoffice/program/soffice",
+    "/opt/libreoffice*/program/soffice",
+]
+
+
+def _noop(message):
+    pass
+
+
+def find_soffice():
+    """查找soffice可执行文件，未找到返回None"""
+    configured = os.environ.get('WORD2PDF_SOFFICE')
+    if configured:
+        return configured if os.path.exists(configured) else None
+    for name in ('soffice', 'libreoffice'):
+        path = shutil.which(name)
+        if path:
+            return path
+    for pattern in SOFFICE_CANDIDATES:
+        for path in sorted(glob.glob(pattern), reverse=True):
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def _uno_available():
+    return importlib.util.find_spec('uno') is not None
+
+
+def _env_number(name, default, cast=int):
+    try:
+        return cast(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _file_url(path):
+    """本地路径 -> file:// URL（-env:UserInstallation和UNO都使用URL）"""
+    path = os.path.abspath(path).replace('\\', '/')
+    if not path.startswith('/'):
+        path = '/' + path
+    return 'file://' + path
+
+
+def _kill(process):
+    """结束soffice及其子进程（soffice会再启动soffice.bin）"""
+    if process is None or process.poll() is not None:
+        return
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except OSError:
+        pass
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        pass
+
+
+class LibreOfficeInstance:
+    """
+    一个LibreOffice实例及其专用的用户配置目录
+    mode: 'uno'为常驻进程，'cli'为每次转换启动soffice --convert-to
+    """
+
+    def __init__(self, soffice, profile_dir, mode, name):
+        self.soffice = soffice
+        self.profile_dir = profile_dir
+        self.mode = mode
+        self.name = name
+        self.jobs = 0
+        self.started = False
+        self._process = None
+        self._desktop = None
+
+    def _base_command(self):
+        return [
+            self.soffice, '--headless', '--invisible', '--norestore', '--nologo',
+            '--nodefault', '--nolockcheck', '-env:UserInstallation=' + _file_url(self.profile_dir),
+        ]
+
+    def _popen(self, command):
+        return subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, start_new_session=True)
+
+    def start(self):
+        """启动常驻实例并建立UNO连接（cli模式无需启动）"""
+        self.started = True
+        if self.mode != 'uno':
+            return
+        import uno
+
+        command = self._base_command() + [
+            f'--accept=pipe,name={self.name};urp;StarOffice.ComponentContext']
+        self._process = self._popen(command)
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local)
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            try:
+                context = resolver.resolve(
+                    f'uno:pipe,name={self.name};urp;StarOffice.ComponentContext')
+                break
+            except Exception:
+                if self._process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("LibreOffice实例启动失败")
+                time.sleep(0.2)
+        self._desktop = context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.frame.Desktop', context)
+
+    def healthy(self):
+        """实例是否可用: 进程存活且UNO连接能响应"""
+        if self.mode != 'uno':
+            return True
+        if self._process is None or self._process.poll() is not None or self._desktop is None:
+            return False
+        try:
+            self._desktop.getFrames().getCount()
+            return True
+        except Exception:
+            return False
+
+    def stop(self):
+        desktop, self._desktop = self._desktop, None
+        if desktop is not None:
+            try:
+                desktop.terminate()
+            except Exception:
+                pass
+        if self._process is not None:
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                _kill(self._process)
+            self._process = None
+
+    def kill(self):
+        """立即结束实例（超时或转换被中断时，实例可能仍在转换）"""
+        _kill(self._process)
+        self._process = None
+        self._desktop = None
+
+    def restart(self):
+        self.stop()
+        self.jobs = 0
+        self.start()
+
+    def convert(self, file_path, pdf_path, timeout):
+        """转换一个文件，超时抛出TimeoutError（实例已被结束）"""
+        self.jobs += 1
+        if self.mode == 'uno':
+            self._convert_uno(file_path, pdf_path, timeout)
+        else:
+            self._convert_cli(file_path, pdf_path, timeout)
+
+    def _convert_uno(self, file_path, pdf_path, timeout):
+        import uno
+        from com.sun.star.beans import PropertyValue
+
+        def props(**values):
+            items = []
+            for key, value in values.items():
+                prop = PropertyValue()
+                prop.Name = key
+                prop.Value = value
+                items.append(prop)
+            return tuple(items)
+
+        outcome = {}
+
+        def run():
+            document = None
+            try:
+                document = self._desktop.loadComponentFromURL(
+                    uno.systemPathToFileUrl(os.path.abspath(file_path)), '_blank', 0,
+                    props(Hidden=True, ReadOnly=True))
+                document.storeToURL(uno.systemPathToFileUrl(os.path.abspath(pdf_path)),
+                                    props(FilterName='writer_pdf_Export'))
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                if document is not None:
+                    try:
+                        document.close(True)
+                    except Exception:
+                        pass
+
+        # UNO调用无法中断，在线程中执行，超时后结束整个实例
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        worker.join(timeout)
+        if worker.is_alive():
+            self.kill()
+            raise TimeoutError(f"LibreOffice转换超时({timeout}秒)")
+        if 'error' in outcome:
+            raise outcome['error']
+
+    def _convert_cli(self, file_path, pdf_path, timeout):
+        # 输出目录放在配置目录旁边，soffice按源文件名生成PDF
+        work_dir = os.path.dirname(self.profile_dir)
+        os.makedirs(work_dir, exist_ok=True)
+        out_dir = tempfile.mkdtemp(prefix='out-', dir=work_dir)
+        try:
+            command = self._base_command() + [
+                '--convert-to', 'pdf:writer_pdf_Export', '--outdir', out_dir,
+                os.path.abspath(file_path)]
+            process = self._popen(command)
+            finished = False
+            try:
+                process.wait(timeout=timeout)
+                finished = True
+            except subprocess.TimeoutExpired:
+                raise TimeoutError(f"LibreOffice转换超时({timeout}秒)")
+            finally:
+                # 超时或等待被中断（如转换引擎的SIGALRM）时不留下无人等待的soffice
+                if not finished:
+                    _kill(process)
+            produced = os.path.join(out_dir, os.path.splitext(os.path.basename(file_path))[0] + '.pdf')
+            if process.returncode != 0 or not os.path.exists(produced):
+                raise RuntimeError(f"soffice退出码 {process.returncode}")
+            shutil.move(produced, pdf_path)
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+class LibreOfficePool:
+    """
+    进程内的LibreOffice实例池，实例在首次使用时启动
+    instances: 实例数，即本进程内可同时进行的LibreOffice转换数
+    timeout: 单个文件超时秒数
+    """
+
+    def __init__(self, soffice=None, instances=None, timeout=None, base_dir=None):
+        self.soffice = soffice or find_soffice()
+        self.instances = instances or _env_number('WORD2PDF_LO_INSTANCES', DEFAULT_INSTANCES)
+        self.timeout = timeout or _env_number('WORD2PDF_LO_TIMEOUT', DEFAULT_TIMEOUT, float)
+        self.mode = 'uno' if _uno_available() else 'cli'
+        self.base_dir = base_dir or os.path.join(
+            tempfile.gettempdir(), f'word2pdf-lo-{os.getpid()}')
+        self.stats = {'jobs': 0, 'failures': 0, 'timeouts': 0, 'restarts': 0, 'seconds': 0.0}
+        self._idle = queue.LifoQueue()
+        self._created = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def available(self):
+        return self.soffice is not None
+
+    def _acquire(self):
+        """取一个空闲实例，未达到上限时创建新实例"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._created) < self.instances:
+                index = len(self._created)
+                instance = LibreOfficeInstance(
+                    self.soffice, os.path.join(self.base_dir, f'profile-{index}'), self.mode,
+                    f'word2pdf_{os.getpid()}_{index}')
+                self._created.append(instance)
+                return instance
+        return self._idle.get(timeout=self.timeout)
+
+    def convert(self, file_path, pdf_path, log=_noop):
+        """转换一个文件，成功返回True，失败记录原因并返回False"""
+        if self._closed or not self.available:
+            return False
+        start = time.perf_counter()
+        try:
+            instance = self._acquire()
+        except queue.Empty:
+            log("LibreOffice实例全部忙，等待超时")
+            return False
+
+        ok = False
+        try:
+            # 健康检查: 未启动、已退出或转换次数过多的实例重启
+            if not instance.started or not instance.healthy() or \
+                    instance.jobs >= MAX_JOBS_PER_INSTANCE:
+                if instance.started:
+                    self.stats['restarts'] += 1
+                    log(f"重启LibreOffice实例: {instance.name}")
+                instance.restart()
+            instance.convert(file_path, pdf_path, self.timeout)
+            ok = os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0
+        except TimeoutError as e:
+            self.stats['timeouts'] += 1
+            log(str(e))
+        except ConversionError as e:
+            # 转换引擎的超时或取消需传给调用方，不能当作失败改用下一个转换方法；
+            # 实例可能仍在转换，先结束
+            self.stats['timeouts'] += int(isinstance(e, ConversionTimeout))
+            instance.kill()
+            raise
+        except Exception as e:
+            log(f"LibreOffice转换失败: {e}")
+            # 出错后实例状态未知，下次使用前重启
+            instance.stop()
+        finally:
+            self._idle.put(instance)
+            self.stats['jobs'] += 1
+            self.stats['failures'] += int(not ok)
+            self.stats['seconds'] += time.perf_counter() - start
+        return ok
+
+    def status(self):
+        return {
+            'soffice': self.soffice,
+            'mode': self.mode,
+            'instances': self.instances,
+            'started': len(self._created),
+            'timeout': self.timeout,
+            'stats': dict(self.stats, seconds=round(self.stats['seconds'], 3)),
+        }
+
+    def close(self):
+        self._closed = True
+        for instance in self._created:
+            instance.stop()
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """返回本进程的实例池，首次调用时按环境变量创建"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # 只探测soffice路径时不需要，首次创建实例池时才导入
+                import multiprocessing.util
+
+                _pool = LibreOfficePool()
+                # 进程池的工作进程退出时不执行atexit，multiprocessing的Finalize在主进程和工作进程中都会执行
+                multiprocessing.util.Finalize(_pool, _pool.close, exitpriority=10)
+    return _pool
+
+
+def convert_with_libreoffice(file_path, pdf_path, log=_noop):
+    """使用LibreOffice实例池转换，成功返回True"""
+    pool = get_pool()
+    if not pool.available:
+        log("LibreOffice未找到")
+        return False
+    log(f"尝试使用LibreOffice转换({pool.mode})")
+    if os.path.exists(pdf_path):
+        os.remove(pdf_path)
+    if pool.convert(file_path, pdf_path, log=log):
+        log(f"LibreOffice转换成功: {pdf_path}")
+        return True
+    return False
+
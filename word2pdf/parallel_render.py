@@ -0,0 +1,263 @@
+"""
+大文档的分段并行排版
+
+reportlab的一次build只能使用一个CPU。文档足够大时，在分页符/分节符处
+（长时间没有分页时在一级标题处）把文档模型切成若干段，各段在工作进程中独立排版为PDF，
+再由pdf_merge按顺序合并:
+- 工作进程启动时加载字体，第一次排版时创建样式，之后各文档复用
+- 每段从新的一页开始；在分页处切分时与串行排版的分页一致，在一级标题处切分时标题前多一次分页
+- 目录前后有分页时目录单独作为一段，否则与相邻的内容在同一段（不额外分页）；其他段排版完成、
+  确定全局页码后再排版一次目录所在的段（目录的排版与页码无关，页数不变）
+- 书签名按整个文档的标题序号生成，大纲和目录链接的命名目标在合并时按全局页码生成
+"""
+import io
+import time
+import threading
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from reportlab.lib.pagesizes import A4
+
+import font_registry
+from document_model import DocumentModel
+from instrumentation import ConversionTrace
+from conversion_errors import ConversionError, check_cancel
+from pdf_merge import merge_pdfs
+from reportlab_renderer import (ProgressDocTemplate, build_styles, render_model, heading_key,
+                                outline_depth, outline_text, template_output_options, _noop)
+
+# 每段至少包含的内容量（约等于字符数，几十页），更小的文档不分段
+MIN_CHUNK_WEIGHT = 60000
+# 没有分页时，内容量超过目标的该倍数后在一级标题处切分
+HEADING_CUT_FACTOR = 1.5
+# 段落、表格行和图片在估算内容量时的附加权重
+PARAGRAPH_WEIGHT = 80
+TABLE_ROW_WEIGHT = 80
+IMAGE_WEIGHT = 2000
+# 等待分段结果时检查取消请求的间隔（秒）
+CANCEL_POLL_SECONDS = 0.2
+
+
+def _block_weight(block):
+    kind = block.kind
+    if kind == 'paragraph':
+        return len(block.text) + PARAGRAPH_WEIGHT + IMAGE_WEIGHT * len(block.images)
+    if kind == 'table':
+        return sum(len(text) for row in block.rows for text in row) + TABLE_ROW_WEIGHT * len(block.rows)
+    return 0
+
+
+def _is_heading(block):
+    return block.kind == 'paragraph' and block.heading_level is not None and bool(block.text.strip())
+
+
+def _toc_end(blocks, index):
+    """目录之后紧跟的空段落（通常只有一个分页符）与目录放在同一段，避免下一段开头多出空白页"""
+    end = index + 1
+    while end < len(blocks) and blocks[end].kind == 'paragraph' and not blocks[end].text.strip() \
+            and not blocks[end].images:
+        end += 1
+        if blocks[end - 1].break_after:
+            break
+    return end
+
+
+def plan_chunks(model, parts):
+    """
+    将model.blocks分为最多约parts段（目录前后有分页时另成一段），返回[(起始, 结束, 之前的标题数)]
+    文档太小或找不到切分位置时只有一段
+    段末的分页由下一段从新页开始体现，切分处段落的break_after会被清除
+    """
+    blocks = model.blocks
+    weights = [_block_weight(block) for block in blocks]
+    total = sum(weights)
+    parts = min(parts, total // MIN_CHUNK_WEIGHT)
+    if parts < 2:
+        return [(0, len(blocks), 0)]
+
+    target = total / parts
+    cuts = [(0, 0)]
+    weight = 0
+    headings = 0
+    toc_end = None
+    for index, block in enumerate(blocks):
+        if block.kind == 'toc':
+            toc_end = _toc_end(blocks, index)
+        if index and index != cuts[-1][0]:
+            previous = blocks[index - 1]
+            page_break = (previous.kind == 'paragraph' and previous.break_after) or \
+                (block.kind == 'paragraph' and block.break_before)
+            # 只在原有的分页处把目录切为单独一段，否则多出的分页使之后的页码与串行排版不一致
+            toc = (block.kind == 'toc' or index == toc_end) and page_break
+            heading1 = _is_heading(block) and block.heading_level == 1
+            if toc or (page_break and weight >= target) or (heading1 and weight >= target * HEADING_CUT_FACTOR):
+                cuts.append((index, headings))
+                weight = 0
+        weight += weights[index]
+        if _is_heading(block):
+            headings += 1
+
+    chunks = []
+    for position, (start, heading_offset) in enumerate(cuts):
+        end = cuts[position + 1][0] if position + 1 < len(cuts) else len(blocks)
+        last = blocks[end - 1]
+        if end < len(blocks) and last.kind == 'paragraph':
+            last.break_after = False
+        chunks.append((start, end, heading_offset))
+    return chunks
+
+
+class ChunkResult:
+    """一段的排版结果"""
+
+    def __init__(self, pdf, pages, heading_pages, counters):
+        self.pdf = pdf
+        self.pages = pages
+        self.heading_pages = heading_pages
+        self.counters = counters
+
+
+_worker_styles = None
+
+
+def _styles():
+    """工作进程中共用的样式（字体在进程启动时已加载）"""
+    global _worker_styles
+    if _worker_styles is None:
+        fonts = font_registry.get_registry()
+        _worker_styles = build_styles(fonts.body_font, fonts.heading_font)
+    return _worker_styles
+
+
+def render_chunk(model, heading_offset, options, page_numbers):
+    """在工作进程中排版一段，返回ChunkResult"""
+    fonts = font_registry.get_registry()
+    trace = ConversionTrace()
+    buffer = io.BytesIO()
+    pdf = ProgressDocTemplate(buffer, page_numbers=page_numbers, pagesize=A4,
+                              **template_output_options(options))
+    render_model(pdf, model, _styles(), fonts.body_font, options, trace, heading_offset=heading_offset)
+    return ChunkResult(buffer.getvalue(), pdf.page, pdf.canv.heading_pages, trace.counters)
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    """进程内共用的排版进程池，进程数变化时重建"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=font_registry.preload)
+            _pool_workers = workers
+            # 批量转换的工作进程退出前会等待所有子进程，需先关闭进程池（同libreoffice_backend.get_pool）；
+            # 优先级须高于进程池内部队列的Finalize(10)，否则队列先关闭，退出信号无法送达
+            multiprocessing.util.Finalize(_pool, _pool.shutdown, exitpriority=20)
+        return _pool
+
+
+def _discard_pool():
+    """进程池异常或转换被中止: 不再等待已提交的分段，之后重新创建"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _collect(futures, results, progress, cancel_event):
+    """等待futures（future -> 段序号）完成，结果写入results"""
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future]] = future.result()
+            if done:
+                progress(f"正在并行排版: {sum(r is not None for r in results)}/{len(results)}段")
+            check_cancel(cancel_event)
+    except BrokenProcessPool as e:
+        _discard_pool()
+        raise ConversionError(f"排版进程异常退出: {e}")
+    except BaseException:
+        # 取消、超时或某段失败时不再等待其余分段
+        for future in pending:
+            future.cancel()
+        if pending:
+            _discard_pool()
+        raise
+
+
+def render_parallel(model, chunks, pdf_path, options, trace=None, log=_noop, progress=_noop,
+                    cancel_event=None):
+    """
+    按plan_chunks的结果在options.render_workers个进程中分段排版，合并写入pdf_path（文件路径或文件对象）
+    各段交给工作进程后清空model.blocks；返回总页数
+    """
+    trace = trace or ConversionTrace()
+    pool = _get_pool(options.render_workers)
+
+    blocks = model.blocks
+    toc_models = {}
+    futures = {}
+    for index, (start, end, heading_offset) in enumerate(chunks):
+        chunk = DocumentModel()
+        chunk.blocks = blocks[start:end]
+        if any(block.kind == 'toc' for block in chunk.blocks):
+            chunk.headings = model.headings
+            chunk.has_toc = True
+            toc_models[index] = chunk
+        futures[pool.submit(render_chunk, chunk, heading_offset, options, {})] = index
+    # 各段已交给工作进程，释放主进程中的内容
+    blocks.clear()
+
+    results = [None] * len(chunks)
+    start = time.perf_counter()
+    _collect(futures, results, progress, cancel_event)
+    trace.add_time('chunks', time.perf_counter() - start)
+
+    offsets = []
+    pages = 0
+    for result in results:
+        offsets.append(pages)
+        pages += result.pages
+    page_numbers = {}
+    for offset, result in zip(offsets, results):
+        for key, page in result.heading_pages.items():
+            page_numbers[key] = offset + page
+
+    if toc_models:
+        progress("正在生成目录页码...")
+        futures = {pool.submit(render_chunk, toc_models[index], chunks[index][2], options, page_numbers): index
+                   for index in toc_models}
+        toc_results = [None] * len(chunks)
+        with trace.span('toc_pages'):
+            _collect(futures, toc_results, _noop, cancel_event)
+        for index in toc_models:
+            if toc_results[index].pages != results[index].pages:
+                raise ConversionError("目录排版结果与页码无关的假设不成立，页数发生变化")
+            results[index] = toc_results[index]
+
+    outline = []
+    depth = -1
+    for index, (level, text) in enumerate(model.headings):
+        page = page_numbers.get(heading_key(index))
+        if page is None:
+            continue
+        depth = outline_depth(level, depth)
+        outline.append((outline_text(text), depth, page, depth >= 1))
+
+    progress("正在合并PDF...")
+    with trace.span('merge'):
+        merge_pdfs([result.pdf for result in results], pdf_path, outline, page_numbers)
+    for result in results:
+        for name, value in result.counters.items():
+            trace.count(name, value)
+    trace.count('chunks', len(chunks))
+    log(f"分{len(chunks)}段并行排版完成，共{pages}页")
+    return pages
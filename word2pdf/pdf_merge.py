@@ -0,0 +1,352 @@
+"""
+合并reportlab生成的PDF
+
+用于分段并行排版后拼接各段的PDF，只处理reportlab输出的格式（交叉引用表、无对象流、
+页面属性不依赖继承），不是通用的PDF合并工具:
+- 按顺序拼接各文件的页面，只复制页面引用到的对象并重新编号
+- 各文件中TrueType子集字体的名称前缀（如AAAAAA+SimSun）都从同一个序号开始，
+  合并时按文件改为不同的前缀，避免同名但字形不同的子集在阅读器中互相替换
+- 大纲和命名目标（目录链接使用）由调用方按合并后的页码给出
+"""
+import re
+import hashlib
+
+_OBJ_HEADER = re.compile(rb'(\d+)\s+(\d+)\s+obj\s*')
+_DICT_TOKEN = re.compile(rb'<<|>>|[(<]')
+_STRING_TOKEN = re.compile(rb'[()\\]')
+_STRING_START = re.compile(rb'[(<]')
+_STREAM = re.compile(rb'\s*stream\r?\n')
+_LENGTH = re.compile(rb'/Length\s+(\d+)(\s+\d+\s+R)?')
+_REF = re.compile(rb'(\d+)\s+0\s+R\b')
+_PARENT = re.compile(rb'/Parent\s+\d+\s+0\s+R')
+_SUBSET = re.compile(rb'/([A-Z]{6})\+')
+_ROOT = re.compile(rb'/Root\s+(\d+)\s+0\s+R')
+_INFO = re.compile(rb'/Info\s+(\d+)\s+0\s+R')
+_PAGES = re.compile(rb'/Pages\s+(\d+)\s+0\s+R')
+_KIDS = re.compile(rb'/Kids\s*\[([^\]]*)\]')
+_TYPE_PAGES = re.compile(rb'/Type\s*/Pages\b')
+_VERSION = re.compile(rb'%PDF-(\d+\.\d+)')
+
+
+def _skip_string(data, pos):
+    """pos为'('之后的位置，返回字符串结束后的位置"""
+    depth = 1
+    while True:
+        m = _STRING_TOKEN.search(data, pos)
+        if m is None:
+            raise ValueError("PDF字符串没有结束")
+        token = m.group()
+        if token == b'\\':
+            pos = m.end() + 1
+            continue
+        pos = m.end()
+        depth += 1 if token == b'(' else -1
+        if not depth:
+            return pos
+
+
+def _skip_dict(data, pos):
+    """pos为'<<'的位置，返回字典结束后的位置"""
+    depth = 0
+    while True:
+        m = _DICT_TOKEN.search(data, pos)
+        if m is None:
+            raise ValueError("PDF字典没有结束")
+        token = m.group()
+        if token == b'(':
+            pos = _skip_string(data, m.end())
+        elif token == b'<':
+            pos = data.index(b'>', m.end()) + 1
+        else:
+            pos = m.end()
+            depth += 1 if token == b'<<' else -1
+            if not depth:
+                return pos
+
+
+def _rewrite(body, func):
+    """对字符串以外的部分调用func，字符串内容保持不变"""
+    parts = []
+    pos = 0
+    while True:
+        m = _STRING_START.search(body, pos)
+        if m is None:
+            parts.append(func(body[pos:]))
+            return b''.join(parts)
+        if m.group() == b'<' and body.startswith(b'<<', m.start()):
+            parts.append(func(body[pos:m.start() + 2]))
+            pos = m.start() + 2
+            continue
+        if m.group() == b'(':
+            end = _skip_string(body, m.end())
+        else:
+            end = body.index(b'>', m.end()) + 1
+        parts.append(func(body[pos:m.start()]))
+        parts.append(body[m.start():end])
+        pos = end
+
+
+def _refs(body):
+    found = []
+
+    def collect(part):
+        found.extend(int(n) for n in _REF.findall(part))
+        return part
+
+    _rewrite(body, collect)
+    return found
+
+
+class PdfFile:
+    """
+    解析后的PDF: objects为 对象号 -> (字典/值的字节串, 流数据或None)
+    """
+
+    def __init__(self, data):
+        m = _VERSION.match(data)
+        self.version = m.group(1).decode('ascii') if m else '1.4'
+        self.objects = {}
+        pos = 0
+        while True:
+            m = _OBJ_HEADER.search(data, pos)
+            if m is None:
+                break
+            number, start = int(m.group(1)), m.end()
+            stream = None
+            if data.startswith(b'<<', start):
+                end = _skip_dict(data, start)
+                body = data[start:end]
+                s = _STREAM.match(data, end)
+                if s:
+                    length = _LENGTH.search(body)
+                    if length and not length.group(2):
+                        end = s.end() + int(length.group(1))
+                        stream = data[s.end():end]
+                    else:
+                        # 间接引用的长度: 按endstream定位
+                        end = data.index(b'endstream', s.end())
+                        stream = data[s.end():end].rstrip(b'\r\n')
+                pos = data.index(b'endobj', end)
+            else:
+                pos = data.index(b'endobj', start)
+                body = data[start:pos].rstrip()
+            self.objects[number] = (body, stream)
+            pos += len(b'endobj')
+
+        trailer = data[data.rindex(b'trailer'):]
+        self.root = int(_ROOT.search(trailer).group(1))
+        info = _INFO.search(trailer)
+        self.info = int(info.group(1)) if info else None
+
+    def pages(self):
+        """按顺序返回页面对象号"""
+        pages_ref = _PAGES.search(self.objects[self.root][0])
+        result = []
+        stack = [int(pages_ref.group(1))]
+        while stack:
+            number = stack.pop()
+            body = self.objects[number][0]
+            kids = _KIDS.search(body)
+            if _TYPE_PAGES.search(body) and kids:
+                stack.extend(reversed([int(n) for n in _REF.findall(kids.group(1))]))
+            else:
+                result.append(number)
+        return result
+
+    def reachable(self, roots):
+        """从roots出发（页面不经过/Parent）可以到达的对象号，按发现顺序"""
+        seen = set(roots)
+        order = list(roots)
+        index = 0
+        while index < len(order):
+            number = order[index]
+            index += 1
+            entry = self.objects.get(number)
+            if entry is None:
+                continue
+            for ref in _refs(_PARENT.sub(b'', entry[0])):
+                if ref not in seen and ref in self.objects:
+                    seen.add(ref)
+                    order.append(ref)
+        return order
+
+
+def _subset_tag(tag, index):
+    """第index个文件中子集字体的新前缀（第一个文件保持不变）"""
+    if not index:
+        return tag
+    digest = hashlib.md5(b'%d:' % index + tag).digest()
+    return bytes(65 + b % 26 for b in digest[:6])
+
+
+def _text_string(text):
+    """PDF文本字符串（UTF-16BE，十六进制）"""
+    return b'<FEFF' + text.encode('utf-16-be').hex().upper().encode('ascii') + b'>'
+
+
+def _literal(text):
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return b'(' + escaped.encode('latin-1', 'replace') + b')'
+
+
+class _Writer:
+    """写入对象并记录偏移，同时计算文件ID"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.offset = 0
+        self.offsets = {}
+        self.digest = hashlib.md5()
+
+    def write(self, data):
+        self.stream.write(data)
+        self.digest.update(data)
+        self.offset += len(data)
+
+    def write_object(self, number, body, stream=None):
+        self.offsets[number] = self.offset
+        parts = [b'%d 0 obj\n' % number, body]
+        if stream is not None:
+            parts += [b'\nstream\n', stream, b'\nendstream']
+        parts.append(b'\nendobj\n')
+        self.write(b''.join(parts))
+
+
+def _outline_tree(entries):
+    """[(标题, 层级, 页码, 是否折叠)] -> 树形节点"""
+    root = {'kids': []}
+    stack = [root]
+    for title, depth, page, closed in entries:
+        node = {'title': title, 'page': page, 'closed': closed, 'kids': []}
+        del stack[min(depth, len(stack) - 1) + 1:]
+        stack[-1]['kids'].append(node)
+        stack.append(node)
+    return root
+
+
+def _visible(node):
+    """展开node时可见的后代数"""
+    return sum(1 + (0 if kid['closed'] else _visible(kid)) for kid in node['kids'])
+
+
+def merge_pdfs(sources, output, outline=(), destinations=None):
+    """
+    按顺序合并sources（PDF字节串列表）写入output（文件路径或文件对象）
+    outline: [(标题, 层级, 页码, 是否折叠)]，层级从0开始且不跳级，页码为合并后的页码（从1开始）
+    destinations: 命名目标 -> 页码，供使用命名目标的链接跳转
+    返回合并后的页数
+    """
+    if isinstance(output, (str, bytes)) or hasattr(output, '__fspath__'):
+        with open(output, 'wb') as f:
+            return merge_pdfs(sources, f, outline, destinations)
+
+    files = [PdfFile(data) for data in sources]
+    version = max((f.version for f in files), key=lambda v: tuple(map(int, v.split('.'))), default='1.4')
+    writer = _Writer(output)
+    writer.write(b'%%PDF-%s\n%%\x93\x8c\x8b\x9e\n' % version.encode('ascii'))
+
+    catalog, pages_number, info_number = 1, 2, 3
+    next_number = 4
+    page_refs = []
+    for index, pdf in enumerate(files):
+        pages = pdf.pages()
+        numbers = pdf.reachable(pages)
+        mapping = {}
+        for number in numbers:
+            mapping[number] = next_number
+            next_number += 1
+
+        def renumber(part, mapping=mapping, index=index):
+            part = _REF.sub(lambda m: b'%d 0 R' % mapping.get(int(m.group(1)), 0), part)
+            if index:
+                part = _SUBSET.sub(lambda m: b'/' + _subset_tag(m.group(1), index) + b'+', part)
+            return part
+
+        page_set = set(pages)
+        for number in numbers:
+            body, stream = pdf.objects[number]
+            if number in page_set:
+                # 页面改为挂在合并后的页面树下
+                body = b'<< /Parent %d 0 R' % pages_number + _rewrite(_PARENT.sub(b'', body)[2:], renumber)
+            else:
+                body = _rewrite(body, renumber)
+            writer.write_object(mapping[number], body, stream)
+        page_refs.extend(mapping[number] for number in pages)
+
+    def dest(page):
+        page = min(max(page, 1), len(page_refs))
+        return b'[ %d 0 R /Fit ]' % page_refs[page - 1]
+
+    catalog_entries = [b'/Type /Catalog', b'/Pages %d 0 R' % pages_number]
+
+    if outline:
+        root = _outline_tree(outline)
+        nodes = []
+
+        def number_nodes(node):
+            for kid in node['kids']:
+                nonlocal next_number
+                kid['number'] = next_number
+                next_number += 1
+                nodes.append(kid)
+                number_nodes(kid)
+
+        root['number'] = next_number
+        next_number += 1
+        number_nodes(root)
+
+        def link_kids(node):
+            kids = node['kids']
+            for position, kid in enumerate(kids):
+                kid['parent'] = node['number']
+                kid['prev'] = kids[position - 1]['number'] if position else None
+                kid['next'] = kids[position + 1]['number'] if position + 1 < len(kids) else None
+                link_kids(kid)
+
+        link_kids(root)
+        writer.write_object(root['number'], b'<< /Type /Outlines /Count %d /First %d 0 R /Last %d 0 R >>' % (
+            _visible(root), root['kids'][0]['number'], root['kids'][-1]['number']))
+        for node in nodes:
+            parts = [b'<< /Title', _text_string(node['title']), b'/Parent %d 0 R' % node['parent'],
+                     b'/Dest', dest(node['page'])]
+            if node['prev']:
+                parts.append(b'/Prev %d 0 R' % node['prev'])
+            if node['next']:
+                parts.append(b'/Next %d 0 R' % node['next'])
+            if node['kids']:
+                count = _visible(node)
+                parts.append(b'/First %d 0 R /Last %d 0 R /Count %d' % (
+                    node['kids'][0]['number'], node['kids'][-1]['number'], -count if node['closed'] else count))
+            parts.append(b'>>')
+            writer.write_object(node['number'], b' '.join(parts))
+        catalog_entries.append(b'/Outlines %d 0 R /PageMode /UseOutlines' % root['number'])
+
+    if destinations:
+        names = sorted(destinations.items(), key=lambda item: item[0].encode('latin-1', 'replace'))
+        body = b'<< /Names [ ' + b' '.join(_literal(name) + b' ' + dest(page) for name, page in names) + b' ] >>'
+        writer.write_object(next_number, body)
+        catalog_entries.append(b'/Names << /Dests %d 0 R >>' % next_number)
+        next_number += 1
+
+    writer.write_object(pages_number, b'<< /Type /Pages /Count %d /Kids [ %s ] >>' % (
+        len(page_refs), b' '.join(b'%d 0 R' % n for n in page_refs)))
+    writer.write_object(catalog, b'<< ' + b' '.join(catalog_entries) + b' >>')
+    first = files[0] if files else None
+    if first is not None and first.info in first.objects:
+        writer.write_object(info_number, first.objects[first.info][0])
+    else:
+        writer.write_object(info_number, b'<< /Producer (word2pdf) >>')
+
+    xref_offset = writer.offset
+    file_id = writer.digest.hexdigest().encode('ascii')
+    lines = [b'xref\n0 %d\n' % next_number, b'0000000000 65535 f \n']
+    for number in range(1, next_number):
+        if number in writer.offsets:
+            lines.append(b'%010d 00000 n \n' % writer.offsets[number])
+        else:
+            lines.append(b'0000000000 65535 f \n')
+    lines.append(b'trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R /ID [ <%s> <%s> ] >>\n' % (
+        next_number, catalog, info_number, file_id, file_id))
+    lines.append(b'startxref\n%d\n%%%%EOF\n' % xref_offset)
+    writer.write(b''.join(lines))
+    return len(page_refs)
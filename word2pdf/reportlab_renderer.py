@@ -0,0 +1,1009 @@
+"""
+python-docx → reportlab 渲染流程
+
+文档先一次遍历转换为document_model中的紧凑模型并释放python-docx对象，
+流式模式下由生成器逐个产生flowable，通过FlowableStream按需送入排版，
+模型中已处理的块和已排版的flowable随即释放，不再同时保留整个文档的flowable；
+reportlab在保存前仍保留所有页面的内容流，峰值内存仍随页数增长。
+可通过max_memory_mb设置内存上限，超出时中止转换。
+段落中的图片按显示尺寸缩小到image_dpi后经image_cache按内容哈希复用。
+
+标题在排版时（afterFlowable）生成PDF书签和大纲；目录项的页码使用先引用、
+保存PDF前再定义的Form XObject，目录占用的空间与页码无关，一次排版即可得到带页码的目录，
+不需要multiBuild的第二遍排版。
+
+render_workers大于1时，大文档在分页处切分后由parallel_render在多个进程中分段排版再合并；
+分段排版时目录页码由调用方给出，目录链接使用命名目标，大纲在合并时生成。
+
+PDF写入文件路径或调用方提供的可写流（如io.BytesIO），输出大小按写入的字节数统计，不再读取文件；
+压缩方式和可复现输出由ConversionOptions的输出配置决定。
+"""
+import gc
+import os
+import sys
+import time
+import zlib
+import functools
+import threading
+import contextlib
+
+from docx import Document
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import (SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Flowable,
+                                PageBreak)
+from reportlab.platypus.flowables import PageBreakIfNotEmpty
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+from reportlab.pdfbase import pdfmetrics, pdfdoc
+from reportlab.pdfbase.pdfdoc import LinkAnnotation, PDFString, PDFStreamFilterZCompress, PDFTrueTypeFont
+from reportlab.pdfgen.canvas import Canvas
+
+import font_registry
+from document_model import build_document_model
+from image_cache import DEFAULT_DPI, get_image_cache
+from conversion_options import ConversionOptions
+from instrumentation import ConversionTrace, maybe_profile
+from conversion_errors import (ConversionError, ConversionTimeout, ConversionCancelled,
+                               MemoryLimitExceeded, check_cancel)
+
+# 每处理多少个段落报告一次进度
+PROGRESS_INTERVAL = 50
+
+# 长表格预先按行数分段，每段单独交给reportlab拆分，避免对整张表反复计算行高
+TABLE_CHUNK_ROWS = 40
+
+# 表格单元格的左右内边距之和
+TABLE_CELL_PADDING = 20
+
+# 页面框架的内边距之和（reportlab Frame默认每边6磅）
+FRAME_PADDING = 12
+
+# 未指定显示尺寸的图片按该分辨率换算为磅
+IMAGE_FALLBACK_DPI = 96
+
+# 写入PDF文件的缓冲区大小（分段排版合并时逐个对象写入）
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+# 目录只包含前几级标题（书签包含所有级别）
+TOC_MAX_LEVEL = 4
+# 目录页码预留的位数
+TOC_NUMBER_DIGITS = 5
+
+
+def _noop(message):
+    pass
+
+
+def memory_usage_mb():
+    """
+    返回当前进程的常驻内存（MB），无法获取时返回None
+    优先使用psutil，Linux下读取/proc/self/status
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    if sys.platform.startswith('linux'):
+        try:
+            with open('/proc/self/status', encoding='ascii') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+    return None
+
+
+class LevelZCompress(PDFStreamFilterZCompress):
+    """
+    按当前线程设置的级别压缩的FlateDecode过滤器
+    reportlab的页面内容、字体子集和ToUnicode表都使用pdfdoc.PDFZCompress，固定为zlib默认级别；
+    compression()期间替换为本类的实例并设置排版所在线程的压缩级别，
+    最后一个compression()退出时恢复原来的过滤器，不影响进程中其他使用reportlab的代码
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._original = None
+
+    def encode(self, text):
+        if isinstance(text, str):
+            text = text.encode('utf8')
+        return zlib.compress(text, getattr(self._local, 'level', zlib.Z_DEFAULT_COMPRESSION))
+
+    @contextlib.contextmanager
+    def compression(self, level):
+        # 多个线程可能同时排版，替换和恢复按进入的次数计数
+        with self._lock:
+            if not self._active:
+                self._original = pdfdoc.PDFZCompress
+                pdfdoc.PDFZCompress = self
+            self._active += 1
+        previous = getattr(self._local, 'level', zlib.Z_DEFAULT_COMPRESSION)
+        self._local.level = level
+        try:
+            yield
+        finally:
+            self._local.level = previous
+            with self._lock:
+                self._active -= 1
+                if not self._active:
+                    pdfdoc.PDFZCompress = self._original
+                    self._original = None
+
+
+_zcompress = LevelZCompress()
+
+
+def template_output_options(options):
+    """ConversionOptions中的输出设置对应的文档模板参数"""
+    return {'pageCompression': int(options.page_compression), 'invariant': int(options.invariant)}
+
+
+class CountingWriter:
+    """
+    统计写入字节数的输出流包装
+    输出可以是调用方的流（如套接字），不要求支持tell()，写入后也不需要再读取文件大小
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.stream.write(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+
+def embedded_fonts(doc):
+    """
+    统计PDF中嵌入的TrueType字体子集，在canvas.save()之后调用（reportlab保存时才生成子集）
+    返回{字体名: {'subsets': 子集数, 'glyphs': 字形数, 'bytes': 子集字体的字节数（压缩前）}}
+    """
+    fonts = {}
+    for font in doc.idToObject['BasicFonts'].dict.values():
+        if not isinstance(font, PDFTrueTypeFont):
+            continue
+        # BaseFont为"子集标记+字体名"
+        entry = fonts.setdefault(font.BaseFont.split('+', 1)[-1],
+                                 {'subsets': 0, 'glyphs': 0, 'bytes': 0})
+        entry['subsets'] += 1
+        entry['glyphs'] += font.LastChar + 1
+        descriptor = doc.idToObject[font.FontDescriptor.name]
+        entry['bytes'] += len(doc.idToObject[descriptor.dict['FontFile2'].name].content)
+    return fonts
+
+
+class FlowableStream(list):
+    """
+    按需从生成器补充内容的flowable列表
+
+    reportlab在排版循环中每处理一个flowable都会调用len()并删除列表头部，
+    这里在len()时补充到lookahead个，已排版的flowable被删除后即可回收；
+    每补充check_interval个检查一次内存上限
+    """
+
+    def __init__(self, flowables, lookahead=64, max_memory_mb=None, check_interval=200):
+        super().__init__()
+        self._source = iter(flowables)
+        self._lookahead = max(lookahead, 1)
+        self._max_memory_mb = max_memory_mb
+        self._check_interval = check_interval
+        self._pulled = 0
+        self._exhausted = False
+
+    def _check_memory(self):
+        usage = memory_usage_mb()
+        if usage is None or usage <= self._max_memory_mb:
+            return
+        # 先尝试回收已排版的对象
+        gc.collect()
+        usage = memory_usage_mb()
+        if usage > self._max_memory_mb:
+            raise MemoryLimitExceeded(
+                f"内存占用{usage:.0f}MB超过上限{self._max_memory_mb}MB")
+
+    def _fill(self):
+        while not self._exhausted and list.__len__(self) < self._lookahead:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._exhausted = True
+                break
+            self._pulled += 1
+            if self._max_memory_mb and self._pulled % self._check_interval == 0:
+                self._check_memory()
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __bool__(self):
+        return len(self) > 0
+
+
+class OutlineCanvas(Canvas):
+    """
+    记录标题所在页码的画布
+    目录中引用的页码Form在save()时按实际页码定义
+    page_numbers: 分段排版时由调用方给出的全局页码（书签名 -> 页码），标题可能不在本段中
+    """
+
+    def __init__(self, *args, page_numbers=None, **kw):
+        super().__init__(*args, **kw)
+        self.page_numbers = page_numbers
+        self.heading_pages = {}   # 书签名 -> 页码
+        self.page_forms = {}      # Form名 -> (书签名, 字体, 字号, 宽度)
+        self.fonts = {}           # 嵌入的字体子集，见embedded_fonts()
+
+    def link_heading(self, key, rect):
+        """当前坐标系中的矩形链接到标题"""
+        if self.page_numbers is None:
+            self.linkRect('', key, rect, relative=1, thickness=0)
+            return
+        # 分段排版: 标题在其他分段中，使用命名目标，由合并后的文档定义
+        self._addAnnotation(LinkAnnotation(self._absRect(rect, 1), '', PDFString(key), Border='[0 0 0]'))
+
+    def save(self):
+        pages = self.heading_pages if self.page_numbers is None else self.page_numbers
+        for name, (key, font_name, font_size, width) in self.page_forms.items():
+            self.beginForm(name)
+            self.setFont(font_name, font_size)
+            self.drawRightString(width, 0, str(pages.get(key, '')))
+            self.endForm()
+        super().save()
+        self.fonts = embedded_fonts(self._doc)
+
+
+class HeadingParagraph(Paragraph):
+    """
+    带书签信息的标题段落
+    outline: (书签名, 标题级别, 标题文本)
+    """
+
+    def __init__(self, text, style, outline=None, **kw):
+        # split()会以同样的类创建拆分后的段落，此时outline为空
+        super().__init__(text, style, **kw)
+        self.outline = outline
+
+    def split(self, avail_width, avail_height):
+        parts = super().split(avail_width, avail_height)
+        # 跨页拆分时书签放在标题开始的一页
+        if parts:
+            parts[0].outline = self.outline
+        return parts
+
+
+class TocEntry(Flowable):
+    """
+    目录项: 标题文本、引导点和右对齐的页码，整行链接到标题的书签
+    页码宽度固定，排版结果与实际页码无关
+    """
+
+    def __init__(self, text, key, style):
+        Flowable.__init__(self)
+        self.key = key
+        self.style = style
+        self.number_width = pdfmetrics.stringWidth('0' * TOC_NUMBER_DIGITS, style.fontName, style.fontSize)
+        self.paragraph = Paragraph(text.translate(_ESCAPE_TABLE), style)
+        self.width = self.height = 0
+
+    def wrap(self, avail_width, avail_height):
+        self.width = avail_width
+        _, self.height = self.paragraph.wrap(avail_width - self.number_width - self.style.fontSize,
+                                             avail_height)
+        return self.width, self.height
+
+    def _last_line_end(self):
+        """最后一行文字结束的横坐标（左对齐时为段落宽度减去右缩进和该行剩余空间）"""
+        last = self.paragraph.blPara.lines[-1]
+        extra = last[0] if isinstance(last, tuple) else getattr(last, 'extraSpace', 0)
+        return self.paragraph.width - self.style.rightIndent - extra
+
+    def draw(self):
+        canv = self.canv
+        style = self.style
+        self.paragraph.drawOn(canv, 0, 0)
+
+        lines = len(self.paragraph.blPara.lines)
+        baseline = self.height - style.fontSize - (lines - 1) * style.leading
+        number_x = self.width - self.number_width
+        dots_start = self._last_line_end() + style.fontSize / 2
+        dots_end = number_x - style.fontSize / 2
+        dot_width = pdfmetrics.stringWidth('.', style.fontName, style.fontSize)
+        if dots_end > dots_start and dot_width:
+            canv.setFont(style.fontName, style.fontSize)
+            canv.drawRightString(dots_end, baseline, '.' * int((dots_end - dots_start) / dot_width))
+
+        form = f'TocPage_{self.key}'
+        canv.page_forms[form] = (self.key, style.fontName, style.fontSize, self.number_width)
+        canv.saveState()
+        canv.translate(number_x, baseline)
+        canv.doForm(form)
+        canv.restoreState()
+        canv.link_heading(self.key, (0, 0, self.width, self.height))
+
+
+def outline_depth(level, previous_depth):
+    """标题在PDF大纲中的层级: PDF大纲不能跳级（如从1级直接到3级）"""
+    return min(level - 1, previous_depth + 1)
+
+
+class ProgressDocTemplate(SimpleDocTemplate):
+    """
+    在排版过程中报告页数并响应取消请求的文档模板
+    标题排版后添加书签和PDF大纲，并记录页码供目录使用
+    page_numbers不为None时为分段排版: 只记录标题页码，不生成大纲（见OutlineCanvas）
+    """
+
+    def __init__(self, filename, progress=_noop, cancel_event=None, page_numbers=None, **kw):
+        super().__init__(filename, **kw)
+        self._progress = progress
+        self._cancel_event = cancel_event
+        self._page_numbers = page_numbers
+        self._outline_depth = -1
+
+    def build(self, flowables, **kw):
+        kw.setdefault('canvasmaker', functools.partial(OutlineCanvas, page_numbers=self._page_numbers))
+        super().build(flowables, **kw)
+
+    def afterFlowable(self, flowable):
+        check_cancel(self._cancel_event)
+        outline = getattr(flowable, 'outline', None)
+        if outline:
+            key, level, text = outline
+            canv = self.canv
+            canv.heading_pages[key] = self.page
+            if self._page_numbers is not None:
+                return
+            canv.bookmarkPage(key)
+            depth = outline_depth(level, self._outline_depth)
+            canv.addOutlineEntry(text, key, depth, closed=depth >= 1)
+            if self._outline_depth < 0:
+                canv.showOutline()
+            self._outline_depth = depth
+
+    def afterPage(self):
+        self._progress(f"正在排版PDF: 第{self.page}页")
+
+
+def build_styles(body_font, heading_font):
+    """
+    创建正文、标题和目录样式，设置中文字体
+    """
+    styles = getSampleStyleSheet()
+    custom_styles = {}
+
+    custom_styles['Normal'] = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontName=body_font,
+        fontSize=12,
+        leading=15,
+        # run中设置了较大字号时自动增加行距
+        autoLeading='max',
+        wordWrap='CJK',
+        )
+
+    # 创建各级标题样式，设置中文字体
+    for i in range(1, 7):
+        heading_style = ParagraphStyle(
+            f'CustomHeading{i}',
+            parent=styles.get(f'Heading{i}', styles['Heading1']),
+            fontName=heading_font,
+            fontSize=16 - i * 2 if i <= 4 else 10,
+            leading=20 - i * 2 if i <= 4 else 12
+        )
+        custom_styles[f'Heading{i}'] = heading_style
+
+    # 创建目录样式
+    custom_styles['TOC'] = styles['Normal']
+
+    # 为目录项创建不同级别的样式，设置中文字体
+    for i in range(1, 5):
+        toc_style = ParagraphStyle(
+            f'CustomTOC{i}',
+            parent=custom_styles['Normal'],
+            leftIndent=i * 30,
+            spaceAfter=6,
+            fontName=body_font
+        )
+        custom_styles[f'TOC{i}'] = toc_style
+
+    # 表格中需要换行的单元格
+    custom_styles['TableCell'] = ParagraphStyle(
+        'CustomTableCell',
+        parent=custom_styles['Normal'],
+        fontSize=10,
+        leading=12,
+    )
+
+    return custom_styles
+
+
+# 一次translate完成HTML特殊字符转义、制表符展开和换行转换
+_ESCAPE_TABLE = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '\t': '    ',
+    '\n': '<br/>',
+})
+
+# Word中的字体名 -> reportlab中注册的字体名
+FONT_ALIASES = {
+    '宋体': 'SimSun',
+    '黑体': 'SimHei',
+}
+
+
+def _escape_attr(value):
+    return value.replace('&', '&amp;').replace('"', '&quot;').replace('<', '&lt;')
+
+
+def run_markup(fmt, link):
+    """
+    返回格式和链接对应的(起始标签, 结束标签)
+    """
+    opening, closing = _format_markup(fmt)
+    if link:
+        return f'<a href="{_escape_attr(link)}" color="blue">{opening}', f'{closing}</a>'
+    return opening, closing
+
+
+# 链接各不相同，不放入缓存键；格式组合有限，上限只防止长期运行的服务进程中无限增长
+@functools.lru_cache(maxsize=4096)
+def _format_markup(fmt):
+    """
+    返回格式对应的(起始标签, 结束标签)
+    相同的格式只生成一次
+    """
+    opening = []
+    closing = []
+
+    font_attrs = []
+    font_name = FONT_ALIASES.get(fmt.font, fmt.font)
+    # 只使用已注册的字体，其他字体沿用段落样式的中文字体
+    if font_name and font_name in pdfmetrics.getRegisteredFontNames():
+        font_attrs.append(f'name="{font_name}"')
+    if fmt.size:
+        font_attrs.append(f'size="{fmt.size:g}"')
+    if fmt.color:
+        font_attrs.append(f'color="{fmt.color}"')
+    if font_attrs:
+        opening.append(f'<font {" ".join(font_attrs)}>')
+        closing.append('</font>')
+
+    for enabled, tag in ((fmt.bold, 'b'), (fmt.italic, 'i'), (fmt.underline, 'u'), (fmt.strike, 'strike')):
+        if enabled:
+            opening.append(f'<{tag}>')
+            closing.append(f'</{tag}>')
+
+    if fmt.vert_align == 'superscript':
+        opening.append('<super>')
+        closing.append('</super>')
+    elif fmt.vert_align == 'subscript':
+        opening.append('<sub>')
+        closing.append('</sub>')
+
+    return ''.join(opening), ''.join(reversed(closing))
+
+
+def process_text_with_formatting(block):
+    """
+    将段落的run转换为reportlab标记，保留粗体、斜体、下划线、颜色、字号和超链接
+    格式相同的相邻run合并到同一组标签中
+    """
+    parts = []
+    current = None
+    suffix = ''
+    for run in block.runs:
+        if not run.text:
+            continue
+        key = (run.fmt, run.link)
+        if key != current:
+            parts.append(suffix)
+            prefix, suffix = run_markup(*key)
+            parts.append(prefix)
+            current = key
+        parts.append(run.text.translate(_ESCAPE_TABLE))
+    parts.append(suffix)
+    return ''.join(parts)
+
+
+def _paragraph_style(block, custom_styles):
+    if block.style_name in custom_styles:
+        return custom_styles[block.style_name]
+    if block.heading_level is not None and block.heading_level <= 6:
+        return custom_styles.get(f'Heading{block.heading_level}', custom_styles['Normal'])
+    return custom_styles['Normal']
+
+
+def _paragraph_flowable(block, custom_styles, outline=None):
+    """outline不为空时生成带书签信息的HeadingParagraph"""
+    pdf_style = _paragraph_style(block, custom_styles)
+
+    # 处理文本和格式
+    formatted_text = process_text_with_formatting(block)
+
+    def make(text):
+        if outline:
+            return HeadingParagraph(text, pdf_style, outline)
+        return Paragraph(text, pdf_style)
+
+    # 添加段落，捕获可能的编码问题
+    try:
+        return make(formatted_text)
+    except Exception:
+        # 如果段落处理失败，尝试简化文本
+        try:
+            simplified_text = ''.join(char for char in formatted_text if ord(char) < 128 or char in '，。；：、？！""''（）【】《》')
+            return make(simplified_text)
+        except Exception:
+            return make("[无法转换的文本]")
+
+
+class EmbeddedImage(Flowable):
+    """
+    文档中的图片，reader来自图片缓存
+    同一ImageReader多次绘制时reportlab只嵌入一次图片数据
+    """
+
+    def __init__(self, reader, width, height):
+        Flowable.__init__(self)
+        self.reader = reader
+        self.width = width
+        self.height = height
+
+    def wrap(self, avail_width, avail_height):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.width, self.height, mask='auto')
+
+
+def _fit(width, height, max_width, max_height):
+    scale = min(1.0, max_width / width, max_height / height)
+    return width * scale, height * scale
+
+
+def _image_flowables(block, frame_width, frame_height, dpi, trace):
+    """段落中的图片，按页面可用区域等比缩小；无法解码的图片跳过"""
+    cache = get_image_cache()
+    max_width = frame_width - FRAME_PADDING
+    max_height = (frame_height or frame_width) - FRAME_PADDING
+    flowables = []
+    for image in block.images:
+        width, height = image.width, image.height
+        if width and height:
+            width, height = _fit(width, height, max_width, max_height)
+        prepared = cache.get(image.digest, image.blob, width, height, dpi)
+        if prepared is None:
+            trace.count('images_skipped')
+            continue
+        reader, pixel_width, pixel_height = prepared
+        if not (width and height):
+            width, height = _fit(pixel_width * 72 / IMAGE_FALLBACK_DPI,
+                                 pixel_height * 72 / IMAGE_FALLBACK_DPI, max_width, max_height)
+        flowables.append(EmbeddedImage(reader, width, height))
+        trace.count('images')
+    return flowables
+
+
+@functools.lru_cache(maxsize=None)
+def _table_style(font_name, header_rows):
+    """所有表格共用的样式，按字体和标题行数缓存"""
+    commands = [
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('FONTNAME', (0, 0), (-1, -1), font_name),  # 使用中文字体
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 10),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]
+    if header_rows:
+        commands.insert(0, ('BACKGROUND', (0, 0), (-1, header_rows - 1), colors.grey))
+    return TableStyle(commands)
+
+
+def _column_widths(block, frame_width):
+    """使用Word中的列宽，超出页面宽度时按比例缩小；没有列宽时平均分配"""
+    columns = len(block.rows[0])
+    widths = block.col_widths
+    if not widths:
+        return [frame_width / columns] * columns
+    total = sum(widths)
+    if total > frame_width:
+        return [w * frame_width / total for w in widths]
+    return list(widths)
+
+
+def _chunk_bounds(block, header_rows):
+    """
+    返回各分段的行范围[(起始行, 结束行)]，分段边界不会落在纵向合并的单元格中间
+    """
+    total = len(block.rows)
+    if total - header_rows <= TABLE_CHUNK_ROWS:
+        return [(0, total)]
+
+    # 不能作为分段起点的行（位于纵向合并区域内部）
+    blocked = set()
+    for col0, row0, col1, row1 in block.spans:
+        if row0 < header_rows <= row1:
+            # 合并区域跨越标题行，不分段
+            return [(0, total)]
+        blocked.update(range(row0 + 1, row1 + 1))
+
+    bounds = []
+    start = 0
+    while start < total:
+        end = max(start, header_rows) + TABLE_CHUNK_ROWS
+        while end < total and end in blocked:
+            end += 1
+        end = min(end, total)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+class ContinuedTable(Flowable):
+    """
+    有标题行的长表格第一段之后的分段
+    在页面顶部开始时带上标题行（与reportlab跨页拆分时重复的标题行一致），
+    在页面中间紧接上一段时不重复；跨页拆分后的剩余部分从新页面开始，带上标题行
+    make_table(start, end, with_header): 创建第start~end行的Table
+    """
+
+    def __init__(self, make_table, start, end):
+        Flowable.__init__(self)
+        self._make_table = make_table
+        self._start = start
+        self._end = end
+        self._tables = {}   # 是否带标题行 -> Table，wrap和split共用
+        self._table = None
+
+    def _get_table(self):
+        with_header = self._at_top()
+        if with_header not in self._tables:
+            self._tables[with_header] = self._make_table(self._start, self._end, with_header)
+        return with_header, self._tables[with_header]
+
+    def _at_top(self):
+        frame = getattr(getattr(self.canv, '_doctemplate', None), 'frame', None)
+        return frame is None or bool(frame._atTop)
+
+    def wrap(self, avail_width, avail_height):
+        _, self._table = self._get_table()
+        self.width, self.height = self._table.wrapOn(self.canv, avail_width, avail_height)
+        return self.width, self.height
+
+    def split(self, avail_width, avail_height):
+        with_header, table = self._get_table()
+        parts = table.splitOn(self.canv, avail_width, avail_height)
+        if with_header or len(parts) < 2:
+            # 标题行已在本页顶部时，之后的拆分由reportlab重复标题行
+            return parts
+        rows = len(parts[0]._cellvalues)
+        return [parts[0], ContinuedTable(self._make_table, self._start + rows, self._end)]
+
+    def draw(self):
+        self._table.drawOn(self.canv, 0, 0)
+
+
+def _table_flowables(block, custom_styles, base_font, frame_width):
+    """
+    将TableBlock转换为reportlab表格
+    合并单元格转换为SPAN；长表格按TABLE_CHUNK_ROWS分段，各段不复制任何行；
+    标记为标题行(w:tblHeader)的行只在每页顶部重复（见ContinuedTable）
+    """
+    rows = block.rows
+    if not rows or not rows[0]:
+        return []
+
+    col_widths = _column_widths(block, frame_width)
+    cell_style = custom_styles['TableCell']
+    font_size = cell_style.fontSize
+
+    # 合并单元格的宽度
+    span_widths = {}
+    for col0, row0, col1, row1 in block.spans:
+        span_widths[(col0, row0)] = sum(col_widths[col0:col1 + 1])
+
+    def cell(text, col, row):
+        if not text:
+            return ''
+        width = span_widths.get((col, row), col_widths[col]) if span_widths else col_widths[col]
+        # 放得下的短文本直接作为字符串，避免为每个单元格创建Paragraph
+        # 估算宽度: 西文字符按0.6个字号，中文等全角字符按1个字号
+        if '\n' not in text:
+            narrow = len(text.encode('ascii', 'ignore'))
+            if (narrow * 0.6 + len(text) - narrow) * font_size <= width - TABLE_CELL_PADDING:
+                return text
+        return Paragraph(text.translate(_ESCAPE_TABLE), cell_style)
+
+    data = [[cell(text, col, row) for col, text in enumerate(cells)] for row, cells in enumerate(rows)]
+    header_rows = min(block.header_rows, len(rows))
+
+    def make_table(start, end, with_header):
+        if start == 0:
+            # 没有标记标题行时第一行仍使用灰色背景（与之前的表头一致），但不重复
+            style, repeat = _table_style(base_font, header_rows or 1), header_rows
+        elif with_header:
+            style, repeat = _table_style(base_font, header_rows), header_rows
+        else:
+            style, repeat = _table_style(base_font, 0), 0
+        chunk = data[start:end]
+        offset = -start
+        span_commands = []
+        if start and with_header:
+            chunk = data[:header_rows] + chunk
+            offset += header_rows
+            span_commands = [('SPAN', (col0, row0), (col1, row1))
+                             for col0, row0, col1, row1 in block.spans if row1 < header_rows]
+        span_commands += [('SPAN', (col0, row0 + offset), (col1, row1 + offset))
+                          for col0, row0, col1, row1 in block.spans if start <= row0 and row1 < end]
+        table_obj = Table(chunk, colWidths=col_widths, repeatRows=repeat)
+        table_obj.setStyle(style)
+        if span_commands:
+            table_obj.setStyle(TableStyle(span_commands))
+        return table_obj
+
+    flowables = []
+    for start, end in _chunk_bounds(block, header_rows):
+        if start and header_rows:
+            flowables.append(ContinuedTable(make_table, start, end))
+        else:
+            flowables.append(make_table(start, end, False))
+
+    flowables.append(Spacer(1, 0.5*inch))
+    return flowables
+
+
+def heading_key(index):
+    """第index个标题（从0开始，与model.headings的顺序一致）的书签名"""
+    return f'heading{index}'
+
+
+def outline_text(text):
+    """书签和目录中的标题文本（合并连续空白）"""
+    return ' '.join(text.split())
+
+
+def toc_flowables(model, custom_styles):
+    """根据文档中的标题重建目录，目录项带页码并链接到标题"""
+    flowables = [
+        Paragraph("目录", custom_styles.get('Heading1', custom_styles['Normal'])),
+        Spacer(1, 0.3*inch),
+    ]
+    for index, (level, text) in enumerate(model.headings):
+        if level <= TOC_MAX_LEVEL:
+            style = custom_styles.get(f'TOC{level}', custom_styles['TOC'])
+            flowables.append(TocEntry(outline_text(text), heading_key(index), style))
+    flowables.append(Spacer(1, 0.5*inch))
+    return flowables
+
+
+def iter_flowables(model, custom_styles, base_font, frame_width, release=False, progress=_noop,
+                   cancel_event=None, trace=None, frame_height=None, image_dpi=DEFAULT_DPI,
+                   heading_offset=0):
+    """
+    按模型中的顺序产生flowable
+    release为True时，每个块处理完后从模型中移除以释放内存
+    trace中记录生成目录、段落、表格和图片flowable的耗时（流式模式下包含在build阶段内）
+    heading_offset: 分段排版时本段之前的标题数，书签名与整个文档的model.headings一致
+    """
+    trace = trace or ConversionTrace()
+    clock = time.perf_counter
+    produced = 0
+    image_cache = get_image_cache()
+    cache_hits = image_cache.hits
+    headings = heading_offset
+
+    blocks = model.blocks
+    total = len(blocks)
+    for index in range(total):
+        block = blocks[index]
+        if release:
+            blocks[index] = None
+
+        if index % PROGRESS_INTERVAL == 0:
+            check_cancel(cancel_event)
+            progress(f"正在生成内容: {index}/{total}")
+
+        if block.kind == 'toc':
+            start = clock()
+            toc = toc_flowables(model, custom_styles)
+            trace.add_time('toc', clock() - start)
+            for flowable in toc:
+                yield flowable
+                produced += 1
+            continue
+
+        if block.kind == 'table':
+            start = clock()
+            try:
+                table_flowables = _table_flowables(block, custom_styles, base_font, frame_width)
+            except Exception as table_error:
+                # 表格处理失败时添加错误标记
+                table_flowables = [Paragraph(f"[无法转换的表格: {str(table_error)[:50]}...]", custom_styles['Normal'])]
+            trace.add_time('tables', clock() - start)
+            trace.count('tables')
+            trace.count('table_rows', len(block.rows))
+            for flowable in table_flowables:
+                yield flowable
+                produced += 1
+            continue
+
+        if block.break_before:
+            yield PageBreakIfNotEmpty()
+
+        if block.text.strip():
+            start = clock()
+            outline = None
+            if block.heading_level is not None:
+                # 与model.headings的顺序一致
+                outline = (heading_key(headings), block.heading_level, outline_text(block.text))
+                headings += 1
+            flowable = _paragraph_flowable(block, custom_styles, outline)
+            trace.add_time('paragraphs', clock() - start)
+            trace.count('paragraphs')
+            trace.count('runs', len(block.runs))
+            yield flowable
+            produced += 1
+
+            if block.is_heading:
+                yield Spacer(1, 0.2*inch)
+
+        if block.images:
+            start = clock()
+            image_flowables = _image_flowables(block, frame_width, frame_height, image_dpi, trace)
+            trace.add_time('images', clock() - start)
+            for flowable in image_flowables:
+                yield flowable
+                produced += 1
+
+        if block.break_after:
+            yield PageBreak()
+
+    if image_cache.hits > cache_hits:
+        trace.count('image_cache_hits', image_cache.hits - cache_hits)
+
+    # 确保flowables不为空
+    if not produced:
+        yield Paragraph("[空文档]", custom_styles['Normal'])
+
+
+def render_model(pdf, model, custom_styles, base_font, options, trace, log=_noop, progress=_noop,
+                 cancel_event=None, heading_offset=0):
+    """在模板pdf中排版模型，返回页数"""
+    flowables = iter_flowables(model, custom_styles, base_font, pdf.width, release=options.streaming,
+                               progress=progress, cancel_event=cancel_event, trace=trace,
+                               frame_height=pdf.height, image_dpi=options.image_dpi,
+                               heading_offset=heading_offset)
+    if options.streaming:
+        log(f"使用流式转换，预读{options.lookahead}个元素，内存上限: {options.max_memory_mb or '不限'}MB")
+        flowables = FlowableStream(flowables, options.lookahead, options.max_memory_mb)
+    else:
+        flowables = list(flowables)
+    with trace.span('build'), _zcompress.compression(options.compress_level):
+        pdf.build(flowables)
+    if options.font_stats:
+        for name, stats in pdf.canv.fonts.items():
+            for key, value in stats.items():
+                trace.count(f'font.{name}.{key}', value)
+    return pdf.page
+
+
+def _plan_chunks(model, options, log):
+    """render_workers大于1且文档足够大时返回分段，否则返回None"""
+    if not options.render_workers or options.render_workers < 2:
+        return None
+    # 只在分段排版时加载进程池和PDF合并
+    import parallel_render
+    chunks = parallel_render.plan_chunks(model, options.render_workers)
+    if len(chunks) < 2:
+        log("文档较小或没有可切分的位置，不分段排版")
+        return None
+    log(f"分{len(chunks)}段并行排版，进程数: {options.render_workers}")
+    return chunks
+
+
+def convert_with_reportlab(file_path, pdf_path, log=_noop, progress=_noop, cancel_event=None,
+                           options=None, trace=None):
+    """
+    使用python-docx读取文档并通过reportlab生成PDF
+    pdf_path: 输出文件路径，或可写的二进制流（如io.BytesIO），流由调用方关闭
+    返回生成的页数，失败时抛出ConversionError，取消时抛出ConversionCancelled
+    trace: ConversionTrace，记录各阶段耗时和计数，写入的字节数记为bytes_written
+    """
+    options = options or ConversionOptions()
+    trace = trace or ConversionTrace()
+    with maybe_profile(options.profile_dir, file_path):
+        if hasattr(pdf_path, 'write'):
+            return _convert_with_reportlab(file_path, pdf_path, log, progress, cancel_event, options, trace)
+        try:
+            with open(pdf_path, 'wb', buffering=OUTPUT_BUFFER_SIZE) as f:
+                return _convert_with_reportlab(file_path, f, log, progress, cancel_event, options, trace)
+        except ConversionError:
+            # 转换失败、取消、超时或超出内存上限时删除未写完的文件
+            if os.path.exists(pdf_path):
+                os.remove(pdf_path)
+            raise
+        except OSError as e:
+            raise ConversionError(f"无法写入PDF文件: {e}")
+
+
+def _convert_with_reportlab(file_path, output, log, progress, cancel_event, options, trace):
+    log("开始执行reportlab转换流程")
+    # 注册中文字体以支持中文显示（每个进程只加载一次）
+    with trace.span('fonts'):
+        fonts = font_registry.get_registry()
+    base_font = fonts.body_font
+    log(f"字体注册状态: {fonts.cjk}, 基础字体: {base_font}, 标题字体: {fonts.heading_font}")
+    for warning in fonts.warnings:
+        log(f"字体警告: {warning}")
+
+    # 使用python-docx读取Word文档，生成模型后即释放
+    progress("正在解析Word文档...")
+    try:
+        with trace.span('load_docx'):
+            document = Document(file_path)
+        with trace.span('document_model'):
+            model = build_document_model(document)
+        del document
+        log(f"成功读取Word文档，包含{model.paragraph_count}个段落和{model.table_count}个表格")
+    except Exception as doc_error:
+        log(f"读取Word文档失败: {str(doc_error)}")
+        raise ConversionError(f"读取Word文档失败: {str(doc_error)}")
+
+    chunks = _plan_chunks(model, options, log)
+    # 统计写入的字节数，替代写入后读取文件大小
+    output = CountingWriter(output)
+    if chunks is None:
+        try:
+            pdf = ProgressDocTemplate(output, progress=progress, cancel_event=cancel_event, pagesize=A4,
+                                      **template_output_options(options))
+            log(f"成功创建PDF模板，输出配置: {options.output_profile}")
+        except Exception as template_error:
+            error_msg = f"创建PDF模板失败: {str(template_error)}"
+            log(error_msg)
+            raise ConversionError(error_msg)
+
+        with trace.span('styles'):
+            custom_styles = build_styles(fonts.body_font, fonts.heading_font)
+
+    # 构建PDF - 加强错误处理
+    try:
+        progress("正在排版PDF...")
+        if chunks is None:
+            pages = render_model(pdf, model, custom_styles, base_font, options, trace, log, progress,
+                                 cancel_event)
+        else:
+            import parallel_render
+            pages = parallel_render.render_parallel(model, chunks, output, options, trace, log, progress,
+                                                    cancel_event)
+        del model
+
+        if not output.bytes_written:
+            raise ConversionError("PDF文件创建失败或为空")
+    except (ConversionCancelled, ConversionTimeout, MemoryLimitExceeded):
+        raise
+    except Exception as build_error:
+        error_msg = f"PDF生成失败: {str(build_error)}"
+
+        # 检查是否是文件写入问题
+        if "write" in str(build_error).lower() or "NoneType" in str(build_error):
+            error_msg += "\n\n可能原因:\n1. 没有写入权限\n2. 文件被其他程序占用\n3. 磁盘空间不足\n4. 路径包含特殊字符\n5. PDF构建器初始化失败"
+
+        raise ConversionError(error_msg)
+
+    trace.count('pages', pages)
+    trace.count('bytes_written', output.bytes_written)
+    return pages
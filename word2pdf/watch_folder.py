@@ -0,0 +1,665 @@
+"""
+监视目录，只重新转换发生变化的Word文件
+
+    python watch_folder.py D:\\docs -o D:\\pdf -w 4
+    python watch_folder.py /srv/docs --poll 30      # 网络共享目录上的远程修改只能通过轮询发现
+    python watch_folder.py /srv/docs --once         # 同步一次后退出
+
+- Linux下使用inotify（通过ctypes调用libc，不需要额外的包）；其他系统、inotify不可用
+  或监视的目录数超过系统上限时回退为定时扫描目录
+- 同一文件的事件在debounce秒内没有新事件后才处理，Word保存一次会产生多次写入和重命名
+- 大小和修改时间与上次记录一致时不读取文件；不一致时计算SHA-256，内容相同则只更新记录
+- 需要转换的文件在主线程中排队，同时交给进程池的文件数有上限；
+  转换过程中文件再次变化时，完成后重新检查
+- 每个文件的大小、修改时间和哈希保存在状态文件中，重启后只处理期间变化的文件；
+  转换器版本、字体或输出选项变化时全部重新转换
+- PDF由convert_file写入临时文件后重命名，下游不会读到写了一半的PDF
+"""
+import os
+import sys
+import json
+import time
+import heapq
+import errno
+import select
+import signal
+import struct
+import argparse
+import tempfile
+import threading
+import ctypes
+import ctypes.util
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from conversion_cache import ConversionCache, DEFAULT_MAX_BYTES, file_digest
+from conversion_engine import (BATCH_BACKENDS, ConversionResult, cache_context, convert_in_worker,
+                               default_pdf_path, is_docx_file, preload_worker)
+from conversion_options import ConversionOptions, DEFAULT_DPI, add_output_arguments, output_arguments
+from instrumentation import JsonLinesLogger
+
+# 最后一次事件之后等待的秒数
+DEFAULT_DEBOUNCE = 2.0
+# 轮询模式下扫描目录的间隔秒数
+DEFAULT_POLL_INTERVAL = 10.0
+# 默认单个文件超时秒数
+DEFAULT_TIMEOUT = 300
+# 状态文件名，默认放在输出目录（未指定时为监视目录）下
+STATE_FILE = '.word2pdf-watch.json'
+# 状态有变化时最多间隔多少秒写入一次
+STATE_SAVE_SECONDS = 30
+# 有文件正在转换时检查结果的间隔秒数
+RESULT_POLL_SECONDS = 0.2
+# 空闲时主循环的最长等待秒数（及时响应停止请求）
+IDLE_SECONDS = 1.0
+# 转换进程异常退出时，同时在转换的文件都会失败，每个文件最多重试的次数
+MAX_CRASH_RETRIES = 1
+
+# inotify事件，见<sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+# 不监视IN_MODIFY，写入过程中的每次write都会产生该事件，以IN_CLOSE_WRITE为准
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len]
+_EVENT = struct.Struct('iIII')
+_READ_SIZE = 256 * 1024
+
+
+def _noop(message):
+    pass
+
+
+def _signature(path):
+    """文件的(修改时间ns, 大小)"""
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def scan_tree(root):
+    """递归收集root下的Word文件，返回{路径: (修改时间ns, 大小)}，无法访问的目录跳过"""
+    found = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif is_docx_file(entry.name) and entry.is_file():
+                        # Windows下scandir已带有stat信息，不需要额外的系统调用
+                        st = entry.stat()
+                        found[entry.path] = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    continue
+    return found
+
+
+class InotifySource:
+    """
+    通过inotify接收目录树中的变化，每个子目录一个监视
+    新建或移入的子目录自动加入监视；监视数超过fs.inotify.max_user_watches时抛出OSError
+    """
+
+    def __init__(self, root):
+        library = ctypes.util.find_library('c')
+        if not library:
+            raise OSError(errno.ENOSYS, "找不到libc")
+        self._libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "当前系统不支持inotify")
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify初始化失败: {os.strerror(error)}")
+        self._watches = {}
+        try:
+            self._add_tree(root)
+        except BaseException:
+            self.close()
+            raise
+
+    def _add(self, directory):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self._watches[wd] = directory
+            return
+        error = ctypes.get_errno()
+        if error == errno.ENOSPC:
+            raise OSError(error, "inotify监视数超过系统上限(fs.inotify.max_user_watches)")
+        if error not in (errno.ENOENT, errno.EACCES, errno.ENOTDIR):
+            raise OSError(error, f"无法监视目录 {directory}: {os.strerror(error)}")
+        # 目录已被删除或没有权限，忽略
+
+    def _add_tree(self, root):
+        self._add(root)
+        for dirpath, dirnames, _ in os.walk(root):
+            for name in dirnames:
+                self._add(os.path.join(dirpath, name))
+
+    def _remove_tree(self, directory):
+        """移出监视范围的目录不再产生事件，其监视描述符中记录的路径已失效"""
+        prefix = directory + os.sep
+        for wd, path in list(self._watches.items()):
+            if path == directory or path.startswith(prefix):
+                self._libc.inotify_rm_watch(self.fd, wd)
+                del self._watches[wd]
+
+    def read(self, timeout):
+        """
+        等待最多timeout秒，返回[(路径, 是否为目录)]
+        内核事件队列溢出时返回None，调用方须重新扫描整个目录
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, _READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        changes = []
+        overflow = False
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, os.fsdecode(name)) if name else directory
+            is_dir = bool(mask & IN_ISDIR)
+            if is_dir and mask & (IN_CREATE | IN_MOVED_TO):
+                self._add_tree(path)
+            elif is_dir and mask & IN_MOVED_FROM:
+                self._remove_tree(path)
+            changes.append((path, is_dir))
+        return None if overflow else changes
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class WatchState:
+    """
+    各文件上次处理时的修改时间、大小和内容哈希，以JSON保存
+    context（转换器版本、字体、转换方法和输出选项）与上次不同时丢弃全部记录
+    """
+
+    def __init__(self, path, context):
+        self.path = path
+        # 经过一次JSON往返，与从文件读出的内容可以直接比较
+        self.context = json.loads(json.dumps(context))
+        self.entries = {}
+        self.dirty = False
+        self.discarded = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            # 状态文件损坏时当作首次运行
+            self.discarded = True
+            return
+        if data.get('context') == self.context:
+            self.entries = data.get('files', {})
+        else:
+            self.discarded = True
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    def set(self, path, signature, digest, error=None):
+        entry = {'mtime_ns': signature[0], 'size': signature[1], 'sha256': digest}
+        if error:
+            entry['error'] = error
+        self.entries[path] = entry
+        self.dirty = True
+
+    def pop(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.dirty = True
+        return entry
+
+    def save(self):
+        """写入临时文件后重命名"""
+        if not self.dirty:
+            return
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'context': self.context, 'files': self.entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.dirty = False
+
+
+class CheckResult:
+    """工作进程中检查并转换一个文件的结果"""
+
+    def __init__(self, signature=None, digest=None, result=None):
+        # 为None表示检查期间文件发生了变化或无法读取，须稍后重新检查
+        self.signature = signature
+        self.digest = digest
+        # ConversionResult，内容与上次相同而未转换时为None
+        self.result = result
+
+
+def check_and_convert(file_path, pdf_path, known_digest, backends, timeout, options, cache):
+    """
+    在工作进程中计算文件哈希，与上次转换时不同（或PDF不存在）时转换
+    转换前后文件的修改时间或大小不一致时，结果中signature为None
+    """
+    try:
+        before = _signature(file_path)
+        digest = file_digest(file_path)
+    except OSError:
+        # 文件已被删除或正在被独占写入
+        return CheckResult()
+    result = None
+    if digest != known_digest or not os.path.exists(pdf_path):
+        result = convert_in_worker(file_path, pdf_path, backends, timeout, options, cache)
+    try:
+        after = _signature(file_path)
+    except OSError:
+        after = None
+    if after != before:
+        return CheckResult(result=result)
+    return CheckResult(before, digest, result)
+
+
+class FolderWatcher:
+    """
+    监视root目录树，保持输出PDF与Word文件同步
+    output_dir: PDF输出目录，按相对root的目录结构存放，默认与源文件同目录
+    workers: 转换进程数，默认为CPU核数；同时交给进程池的文件数为其2倍
+    poll_interval: 指定时始终使用轮询；为None时优先使用inotify
+    prune: 源文件删除后同时删除对应的PDF
+    on_result: 每转换完一个文件时回调，参数为ConversionResult
+    """
+
+    def __init__(self, root, output_dir=None, workers=None, backends=BATCH_BACKENDS, timeout=DEFAULT_TIMEOUT,
+                 options=None, cache=None, debounce=DEFAULT_DEBOUNCE, poll_interval=None, state_path=None,
+                 prune=False, on_result=None, log=_noop):
+        self.root = os.path.abspath(root)
+        self.output_dir = os.path.abspath(output_dir) if output_dir else None
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = self.workers * 2
+        self.backends = tuple(backends)
+        self.timeout = timeout
+        self.options = options
+        self.cache = cache
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.prune = prune
+        self.on_result = on_result
+        self.log = log
+        self.state = WatchState(state_path or os.path.join(self.output_dir or self.root, STATE_FILE),
+                                cache_context(self.backends, options))
+        self.counts = {'converted': 0, 'unchanged': 0, 'failed': 0, 'removed': 0}
+        self._stop = threading.Event()
+        self._due = {}
+        self._heap = []
+        self._queue = deque()
+        self._queued = set()
+        # future -> (路径, 提交时的进程池)
+        self._running = {}
+        self._running_paths = set()
+        self._recheck = set()
+        self._crashes = {}
+        self._snapshot = {}
+        self._pool = None
+        self._last_save = time.monotonic()
+
+    def pdf_path(self, file_path):
+        return default_pdf_path(file_path, self.output_dir, self.root)
+
+    def stop(self):
+        """请求停止，可在其他线程或信号处理函数中调用"""
+        self._stop.set()
+
+    @property
+    def idle(self):
+        return not (self._due or self._queue or self._running)
+
+    def schedule(self, path, delay=None):
+        """path在delay秒（默认debounce）内没有新的变化时检查"""
+        due = time.monotonic() + (self.debounce if delay is None else delay)
+        self._due[path] = due
+        heapq.heappush(self._heap, (due, path))
+
+    def _needs_check(self, path, signature):
+        entry = self.state.get(path)
+        if entry is None or (entry['mtime_ns'], entry['size']) != tuple(signature):
+            return True
+        # 转换失败的文件在内容变化前不再重试
+        return 'error' not in entry and not os.path.exists(self.pdf_path(path))
+
+    def rescan(self, delay=None):
+        """扫描整个目录，与状态记录比较；启动时和inotify事件丢失后调用"""
+        snapshot = scan_tree(self.root)
+        for path, signature in snapshot.items():
+            if self._needs_check(path, signature):
+                self.schedule(path, delay)
+        for path in list(self.state.entries):
+            if path not in snapshot:
+                self.schedule(path, delay)
+        self._snapshot = snapshot
+        return snapshot
+
+    def poll(self):
+        """轮询模式: 与上次扫描结果比较"""
+        snapshot = scan_tree(self.root)
+        previous = self._snapshot
+        for path, signature in snapshot.items():
+            if previous.get(path) != signature:
+                self.schedule(path)
+        for path in previous:
+            if path not in snapshot:
+                self.schedule(path)
+        self._snapshot = snapshot
+
+    def _on_change(self, path, is_dir):
+        if not is_dir:
+            if is_docx_file(os.path.basename(path)):
+                self.schedule(path)
+            return
+        # 目录被创建、移入、移出或删除: 检查其中已记录的文件和现有的文件
+        prefix = path + os.sep
+        for known in list(self.state.entries):
+            if known.startswith(prefix):
+                self.schedule(known)
+        for found in scan_tree(path):
+            self.schedule(found)
+
+    def _removed(self, path):
+        if self.state.pop(path) is None:
+            return
+        self.counts['removed'] += 1
+        pdf_path = self.pdf_path(path)
+        if self.prune and os.path.exists(pdf_path):
+            os.remove(pdf_path)
+            self.log(f"源文件已删除，删除PDF: {pdf_path}")
+
+    def _check(self, path):
+        """去抖时间已到: 文件仍存在且大小或修改时间有变化时排队转换"""
+        try:
+            signature = _signature(path)
+        except FileNotFoundError:
+            self._removed(path)
+            return
+        except OSError as e:
+            self.log(f"无法访问 {path}: {e}")
+            return
+        if self._needs_check(path, signature) and path not in self._queued:
+            self._queue.append(path)
+            self._queued.add(path)
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            due, path = heapq.heappop(self._heap)
+            if self._due.get(path) != due:
+                # 之后又有新的事件，以最后一次为准
+                continue
+            del self._due[path]
+            if path in self._running_paths:
+                self._recheck.add(path)
+            else:
+                self._check(path)
+
+        while self._queue and len(self._running) < self.max_in_flight:
+            path = self._queue.popleft()
+            self._queued.discard(path)
+            entry = self.state.get(path)
+            known_digest = entry['sha256'] if entry else None
+            future = self._pool.submit(check_and_convert, path, self.pdf_path(path), known_digest,
+                                       self.backends, self.timeout, self.options, self.cache)
+            self._running[future] = (path, self._pool)
+            self._running_paths.add(path)
+
+    def _collect(self):
+        for future in [f for f in self._running if f.done()]:
+            path, pool = self._running.pop(future)
+            self._running_paths.discard(path)
+            if future.cancelled():
+                # 停止时尚未开始的文件，状态未更新，下次启动时重新检查
+                continue
+            try:
+                outcome = future.result()
+            except BrokenProcessPool as e:
+                # 工作进程异常退出（如内存不足被杀掉），同一进程池中的文件都会失败，
+                # 无法确定是哪个文件导致的: 各自重试，多次失败后在内容变化前不再重试
+                self._replace_broken_pool(pool)
+                crashes = self._crashes.get(path, 0) + 1
+                self._crashes[path] = crashes
+                if crashes <= MAX_CRASH_RETRIES:
+                    self.schedule(path, delay=0)
+                    continue
+                outcome = self._crashed(path, f"工作进程异常: {e}")
+            self._crashes.pop(path, None)
+            self._finish(path, outcome)
+
+    def _crashed(self, path, error):
+        result = ConversionResult(path, self.pdf_path(path), error=error)
+        try:
+            return CheckResult(_signature(path), None, result)
+        except OSError:
+            return CheckResult(result=result)
+
+    def _finish(self, path, outcome):
+        result = outcome.result
+        if result is not None:
+            self.counts['converted' if result.success else 'failed'] += 1
+            if self.on_result:
+                self.on_result(result)
+        if outcome.signature is None or path in self._recheck:
+            # 转换期间文件又有变化，重新检查
+            self._recheck.discard(path)
+            self.schedule(path)
+            return
+        if result is None:
+            self.counts['unchanged'] += 1
+            self.state.set(path, outcome.signature, outcome.digest)
+        else:
+            self.state.set(path, outcome.signature, outcome.digest, None if result.success else result.error)
+
+    def _create_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=preload_worker,
+                                   initargs=(self.backends,))
+
+    def _replace_broken_pool(self, broken):
+        """进程池中的工作进程异常退出后不可再用，重新创建（同一进程池只重建一次）"""
+        if self._pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._create_pool()
+            self.log("转换进程异常退出，已重建进程池")
+
+    def _open_source(self):
+        """返回InotifySource，不可用时返回None（使用轮询）"""
+        if self.poll_interval is not None or not sys.platform.startswith('linux'):
+            return None
+        try:
+            source = InotifySource(self.root)
+        except OSError as e:
+            self.log(f"inotify不可用，改为每{DEFAULT_POLL_INTERVAL}秒扫描一次: {e}")
+            return None
+        self.log(f"使用inotify监视 {self.root}")
+        return source
+
+    def _save_state(self, force=False):
+        if force or time.monotonic() - self._last_save >= STATE_SAVE_SECONDS:
+            self.state.save()
+            self._last_save = time.monotonic()
+
+    def _timeout(self, next_poll):
+        timeout = RESULT_POLL_SECONDS if self._running else IDLE_SECONDS
+        now = time.monotonic()
+        if self._heap:
+            timeout = min(timeout, self._heap[0][0] - now)
+        if next_poll is not None:
+            timeout = min(timeout, next_poll - now)
+        return max(0.0, timeout)
+
+    def run(self, once=False):
+        """
+        先同步一次整个目录，之后持续处理变化直到stop()；
+        once为True时同步完成后返回
+        """
+        # fork出的工作进程直接继承已导入的模块和已加载的字体
+        preload_worker(self.backends)
+        if self.state.discarded:
+            self.log("转换设置已变化或状态文件无法读取，将重新检查全部文件")
+        self._pool = self._create_pool()
+        # 先建立监视再扫描，扫描期间的变化不会遗漏
+        source = None if once else self._open_source()
+        interval = self.poll_interval or DEFAULT_POLL_INTERVAL
+        next_poll = None if source else time.monotonic() + interval
+        try:
+            self.rescan(delay=0)
+            while not self._stop.is_set():
+                if once and self.idle:
+                    break
+                timeout = self._timeout(None if once else next_poll)
+                if source is not None:
+                    changes = source.read(timeout)
+                    if changes is None:
+                        self.log("inotify事件队列溢出，重新扫描目录")
+                        self.rescan()
+                    else:
+                        for path, is_dir in changes:
+                            self._on_change(path, is_dir)
+                else:
+                    self._stop.wait(timeout)
+                    if not once and time.monotonic() >= next_poll:
+                        self.poll()
+                        next_poll = time.monotonic() + interval
+                self._dispatch()
+                self._collect()
+                self._save_state()
+        finally:
+            if source is not None:
+                source.close()
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._collect()
+            self._save_state(force=True)
+        return self.counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="监视目录并将变化的Word文件转换为PDF")
+    parser.add_argument('root', help="监视的目录（包括子目录）")
+    parser.add_argument('-o', '--output-dir', help="PDF输出目录，默认与源文件同目录")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="并行进程数，默认为CPU核数")
+    parser.add_argument('-t', '--timeout', type=float, default=DEFAULT_TIMEOUT, help="单个文件超时秒数")
+    parser.add_argument('-b', '--backends', default=','.join(BATCH_BACKENDS),
+                        help="转换方法优先级，逗号分隔，可选: docx2pdf,wps,libreoffice,reportlab")
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE,
+                        help=f"文件最后一次变化后等待的秒数，默认{DEFAULT_DEBOUNCE}")
+    parser.add_argument('--poll', type=float, default=None, metavar='SECONDS',
+                        help="不使用inotify，按该间隔扫描目录（网络共享目录须使用轮询）")
+    parser.add_argument('--once', action='store_true', help="同步一次后退出")
+    parser.add_argument('--prune', action='store_true', help="源文件删除后同时删除对应的PDF")
+    parser.add_argument('--state', help=f"状态文件路径，默认为输出目录下的{STATE_FILE}")
+    parser.add_argument('--image-dpi', type=int, default=DEFAULT_DPI,
+                        help=f"图片缩小到的分辨率，0表示保留原图，默认{DEFAULT_DPI}")
+    parser.add_argument('--cache-dir', default=None, help="转换缓存目录，默认为用户缓存目录下的word2pdf")
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="转换缓存上限(MB)")
+    parser.add_argument('--no-cache', action='store_true', help="不使用转换缓存")
+    parser.add_argument('--log', help="以JSON Lines格式记录转换结果")
+    parser.add_argument('-q', '--quiet', action='store_true', help="不逐个输出文件结果")
+    add_output_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.root):
+        parser.error(f"目录不存在: {args.root}")
+    cache = None
+    if not args.no_cache:
+        cache = ConversionCache(args.cache_dir, int(args.cache_size * 1024 * 1024))
+    logger = JsonLinesLogger(args.log) if args.log else None
+
+    def on_result(result):
+        if logger:
+            logger.emit('conversion', **result.to_dict())
+        if args.quiet:
+            return
+        if result.success:
+            print(f"[成功] {result.source} -> {result.pdf_path} ({result.seconds:.2f}秒)")
+        else:
+            print(f"[失败] {result.source}: {result.error}")
+
+    def log(message):
+        if logger:
+            logger(message)
+        if not args.quiet:
+            print(message)
+
+    watcher = FolderWatcher(
+        args.root,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        backends=[b.strip() for b in args.backends.split(',') if b.strip()],
+        timeout=args.timeout,
+        options=ConversionOptions(image_dpi=args.image_dpi, **output_arguments(args)),
+        cache=cache,
+        debounce=args.debounce,
+        poll_interval=args.poll,
+        state_path=args.state,
+        prune=args.prune,
+        on_result=on_result,
+        log=log,
+    )
+    # SIGTERM时与Ctrl+C一样处理完已提交的文件、保存状态后退出
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    try:
+        counts = watcher.run(once=args.once)
+    except KeyboardInterrupt:
+        watcher.stop()
+        counts = watcher.counts
+    finally:
+        if logger:
+            logger.close()
+    print(f"转换: {counts['converted']}  失败: {counts['failed']}  "
+          f"未变化: {counts['unchanged']}  已删除: {counts['removed']}")
+    return 0 if not counts['failed'] else 1
+
+
+if __name__ == "__main__":
+    if getattr(sys, 'frozen', False):
+        # PyInstaller打包后，Windows下进程池的子进程需要
+        import multiprocessing
+        multiprocessing.freeze_support()
+    sys.exit(main())